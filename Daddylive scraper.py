@@ -3,6 +3,7 @@ import xml.etree.ElementTree as ET
 import os
 import json
 import fetcher
+import m3u
 import tvlogo  # Assuming this is the module that handles tv logo extraction
 
 daddyLiveChannelsFileName = '247channels.html'
@@ -150,9 +151,13 @@ for channel in matches:
 
         with open("out.m3u8", 'a', encoding='utf-8') as file:  # Use 'a' mode for appending
             initialPath = payload.get('initial_path')
-            file.write(f'#EXTINF:-1 tvg-id="{channelID["id"]}" tvg-name="{channel[1]}" tvg-logo="https://raw.githubusercontent.com{initialPath}{tvicon["id"]["path"]}" group-title="USA (DADDY LIVE)", {channel[1]}\n')
-            file.write(f"https://xyzdddd.mizhls.ru/lb/premium{channel[0]}/index.m3u8\n")
-            file.write('\n')
+            entry = m3u.Entry.build(f" {channel[1]}", f"https://xyzdddd.mizhls.ru/lb/premium{channel[0]}/index.m3u8", {
+                "tvg-id": channelID["id"],
+                "tvg-name": channel[1],
+                "tvg-logo": f"https://raw.githubusercontent.com{initialPath}{tvicon['id']['path']}",
+                "group-title": "USA (DADDY LIVE)",
+            })
+            file.write(f"{entry}\n\n")
 
         with open("tvg-ids.txt", 'a', encoding='utf-8') as file:  # Use 'a' mode for appending
             file.write(f'{channelID["id"]}\n')
@@ -0,0 +1,114 @@
+# bench.py – micro-benchmarks for the EPG matching hot paths in Events/
+#
+#   python Events/bench.py fuzzy [IDS] [-s SIZE] [-q QUERIES] [--cutoff C ...]
+#
+# Every benchmark checks that the new code returns the same result as the
+# code it replaced before timing both. Without a saved epgshare01 id list
+# (epg_ripper_ALL_SOURCES1.txt) a synthetic one is generated.
+
+import argparse
+import difflib
+import logging
+import random
+import string
+import time
+
+import events
+
+# -----------------------------------------------------------------------------
+
+# fuzzy EPG key matching
+
+# -----------------------------------------------------------------------------
+
+def legacy_fuzzy(query, candidates, n=3, cutoff=0.65):
+    """find_best_epg_match's fuzzy step as it was before EPGLookup.fuzzy."""
+    return difflib.get_close_matches(query, candidates, n=n, cutoff=cutoff)
+
+def synthetic_ids(count=40000, seed=1):
+    """An epgshare01-like id list: brand, number, quality and country parts."""
+    rng = random.Random(seed)
+    brands = ["Sky.Sports", "Sky.Sports.News", "Eurosport", "TNT.Sports", "Polsat.Sport", "Fox.Sports",
+              "BBC.One", "BBC.Two", "ITV", "Arena.Sport", "Canal+.Sport", "DAZN", "ESPN", "beIN.Sports",
+              "Setanta.Sports", "Movistar.Deportes", "Sport.TV", "Nova.Sport", "Premier.Sports", "Viaplay"]
+    countries = ["uk", "us", "de", "pl", "nz", "au", "fr", "es", "pt", "ba", "rs", "cz", "in", "ca"]
+    ids = set()
+    while len(ids) < count:
+        parts = [rng.choice(brands)]
+        if rng.random() < 0.3:
+            parts.append("".join(rng.choices(string.ascii_letters, k=rng.randint(3, 8))))
+        if rng.random() < 0.6:
+            parts.append(str(rng.randint(1, 12)))
+        if rng.random() < 0.4:
+            parts.append(rng.choice(["HD", "4K", "SD", "Plus"]))
+        parts.append(rng.choice(countries))
+        ids.add(".".join(parts))
+    return sorted(ids)
+
+def typo_queries(keys, count, seed=1):
+    """Slugs the way find_best_epg_match builds them, with a few typos."""
+    rng = random.Random(seed)
+    alphabet = string.ascii_lowercase + string.digits + "."
+    queries = ["eurosport1", "skysprtsnewz", "tntsprts1", "polsatsprot", "bbcone", "foxsport1"]
+    while len(queries) < count:
+        chars = list(rng.choice(keys))
+        for _ in range(rng.randint(0, 3)):
+            pos = rng.randrange(len(chars))
+            edit = rng.random()
+            if edit < 0.33 and len(chars) > 1:
+                del chars[pos]
+            elif edit < 0.66:
+                chars.insert(pos, rng.choice(alphabet))
+            else:
+                chars[pos] = rng.choice(alphabet)
+        queries.append("".join(chars))
+    return queries
+
+def bench_fuzzy(args):
+    if args.ids:
+        with open(args.ids, encoding="utf-8", errors="ignore") as f:
+            lines = f.read().splitlines()
+        label = args.ids
+    else:
+        lines = synthetic_ids(args.size)
+        label = f"{args.size} synthetic ids"
+
+    logging.disable(logging.INFO)
+    lookup = events.build_epg_lookup(lines)
+    start = time.perf_counter()
+    lookup.prepare()
+    index = time.perf_counter() - start
+
+    candidates = [key for key in lookup if len(key) >= events.FUZZY_MIN_LEN]
+    queries = typo_queries(candidates, args.queries)
+    print(f"fuzzy EPG matching over {label}: {len(candidates)} keys, {len(queries)} queries")
+    print(f"  index build   {index * 1000:8.2f} ms")
+    for cutoff in args.cutoff:
+        old, new = [], []
+        for query in queries:
+            start = time.perf_counter()
+            expected = legacy_fuzzy(query, candidates, cutoff=cutoff)
+            old.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            got = lookup.fuzzy(query, cutoff=cutoff)
+            new.append(time.perf_counter() - start)
+            assert got == expected, f"{query!r} at cutoff {cutoff}: {got!r} != {expected!r}"
+        print(f"  cutoff {cutoff:.2f}")
+        print(f"    difflib       {sum(old) / len(queries) * 1000:8.2f} ms/query, worst {max(old) * 1000:8.2f} ms")
+        print(f"    EPGLookup     {sum(new) / len(queries) * 1000:8.2f} ms/query, worst {max(new) * 1000:8.2f} ms"
+              f"   ({sum(old) / sum(new):.1f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the events.py EPG matching")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("fuzzy", help="fuzzy alias matching against difflib.get_close_matches")
+    p.add_argument("ids", nargs="?", help="saved EPG id list (default: a synthetic list)")
+    p.add_argument("-s", "--size", type=int, default=40000, help="synthetic ids (default: 40000)")
+    p.add_argument("-q", "--queries", type=int, default=20)
+    p.add_argument("--cutoff", type=float, nargs="+", default=[0.65])
+    p.set_defaults(func=bench_fuzzy)
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
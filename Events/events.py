@@ -44,16 +44,34 @@ from __future__ import annotations
 import argparse
 import base64
 import difflib
+import heapq
 import logging
+import math
+import mmap
+import multiprocessing
+import os
 import re
+import struct
+import sys
+import threading
 import time
 import unicodedata
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from itertools import accumulate, chain
 
 import requests
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import m3u
+from httpcache import HTTPCache
+from streamcheck import (HostHealth, HostRateLimiter, ProbeCache, ProbeResult,
+                         fetch_manifest, make_session)
+
 # ═════════════════════════════ constants ═══════════════════════════════════
 
 SCHEDULE_URL = "https://daddylive.dad/schedule/schedule-generated.php"
@@ -63,6 +81,9 @@ EPG_IDS_URL = "https://epgshare01.online/epgshare01/epg_ripper_ALL_SOURCES1.txt"
 EPG_XML_URL = "https://epgshare01.online/epgshare01/epg_ripper_ALL_SOURCES1.xml.gz"
 TVLOGO_RAW = "https://raw.githubusercontent.com/tv-logo/tv-logos/main/countries/"
 TVLOGO_API = "https://api.github.com/repos/tv-logo/tv-logos/contents/countries"
+EPG_SNAPSHOT = os.getenv("EPG_SNAPSHOT", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "epg-lookup.snap"))
+EPG_SNAPSHOT_FORMAT = 3  # bump when build_epg_lookup or the snapshot layout changes
 
 URL_TEMPLATES = [
     "https://nfsnew.newkso.ru/nfs/premium{num}/mono.m3u8",
@@ -90,6 +111,17 @@ VLC_HEADERS = [
     "Mobile/15E148 Safari/604.1",
 ]
 
+# Shared by every validation worker so a 429 slows down the whole pool for that host
+LIMITER = HostRateLimiter()
+# Probe results shared with all_channels/main.py; only stale URLs are re-probed
+CACHE = ProbeCache()
+# Rolling per-mirror scores deciding probe order and which hosts to skip
+HEALTH = HostHealth()
+# Pooled connections for the validation workers; probes never read past MANIFEST_BYTES
+SESSION = make_session()
+# Revalidates the EPG id list with conditional GETs; unchanged lists answer 304
+HTTP_CACHE = HTTPCache()
+
 # ═════ ENHANCED country helper with better detection ═══════════════════════
 
 COUNTRY_CODES = {
@@ -204,9 +236,359 @@ def _compress_long(slug: str) -> list[str]:
             res.add(slug.replace(full, ab))
     return list(res)
 
+# ── ENHANCED compact EPG index ─────────────────────────────────────────────
+
+FUZZY_MIN_LEN = 3   # shorter alias keys are never fuzzy candidates
+
+ALIAS_WORD_RE = re.compile(r"[a-z0-9]+")
+
+def _char_items(text: str) -> list[str]:
+    """
+    text as a set: the r-th occurrence of character c becomes c * r, so two
+    strings share exactly as many items as their character multisets, the
+    count difflib's quick_ratio is built on
+    """
+    return [c * r for c, count in Counter(text).items() for r in range(1, count + 1)]
+
+NONZERO_BYTE_RE = re.compile(rb"[^\x00]")
+BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+def _char_counts(keys: list[str], la: int):
+    """
+    (c, counts) for every character c of keys, all la characters long:
+    byte i of counts is how often c occurs in keys[i], capped at 255
+    """
+    joined = "".join(keys)
+    try:
+        data = joined.encode("latin-1") if la < 256 else None
+    except UnicodeEncodeError:
+        data = None
+    for c in sorted(set(joined)):
+        if data is None:
+            yield c, bytes(min(key.count(c), 255) for key in keys)
+            continue
+        table = bytearray(256)
+        table[ord(c)] = 1
+        hits = data.translate(table)
+        # column j holds character j of every key; added as base-256
+        # numbers the columns give every key's count in its own byte
+        total = sum(int.from_bytes(hits[j::la], "little") for j in range(la))
+        yield c, total.to_bytes(len(keys), "little")
+
+def _set_bits(mask: int, nbytes: int):
+    """Positions of the set bits of mask, lowest first"""
+    data = mask.to_bytes(nbytes, "little")
+    for match in NONZERO_BYTE_RE.finditer(data):
+        base = match.start() * 8
+        for bit in BYTE_BITS[data[base >> 3]]:
+            yield base + bit
+
+# ── ENHANCED EPG lookup snapshot layout ───────────────────────────────────
+#
+# A built lookup, fuzzy index included, is saved as one file and mapped
+# back into memory by the next run while the id list is unchanged:
+#   header   magic (with the byte order), format, sha256 of the id list,
+#            the sizes of the sections below
+#   strings  ids, alias keys, fuzzy index terms: UTF-8, newline separated
+#   arrays   alias offsets and values, key order, fuzzy term offsets and
+#            values (a bitset's words hold its little-endian bytes), key
+#            slots by length: native uint32, used in place through the mapping
+
+SNAPSHOT_MAGIC = b"EPGLKP" + (b"LE" if sys.byteorder == "little" else b"BE")
+SNAPSHOT_HEADER = struct.Struct("<8sI32s10Q")
+SNAPSHOT_STRINGS = 3    # string sections, sized in bytes; arrays are sized in items
+SNAPSHOT_ITEMSIZE = array('I').itemsize
+
+def _snapshot_sections(data, source: str) -> list[tuple[int, int]] | None:
+    """
+    (start, end) of every section of a snapshot, or None unless data is a
+    snapshot in this format of the id list whose sha256 hex digest is source
+    """
+    if len(data) < SNAPSHOT_HEADER.size:
+        return None
+    magic, version, digest, *sizes = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or version != EPG_SNAPSHOT_FORMAT or digest != bytes.fromhex(source):
+        return None
+    sections, pos = [], SNAPSHOT_HEADER.size
+    for i, size in enumerate(sizes):
+        if i >= SNAPSHOT_STRINGS:
+            if i == SNAPSHOT_STRINGS:
+                pos += -pos % SNAPSHOT_ITEMSIZE
+            size *= SNAPSHOT_ITEMSIZE
+        sections.append((pos, pos + size))
+        pos += size
+    return sections if pos == len(data) else None
+
+class Postings:
+    """
+    Inverted lists packed into two flat arrays: list i is
+    values[offsets[i]:offsets[i + 1]]. A few bytes per entry instead of
+    a Python list object per key plus a reference per entry
+    """
+
+    def __init__(self, offsets: array | None = None, values: array | None = None):
+        self.offsets = offsets if offsets is not None else array('I', [0])
+        self.values = values if values is not None else array('I')
+
+    @classmethod
+    def from_lists(cls, lists) -> Postings:
+        """Pack an iterable of integer lists, in order"""
+        lists = list(lists)
+        offsets = array('I', accumulate(map(len, lists), initial=0))
+        return cls(offsets, array('I', chain.from_iterable(lists)))
+
+    @classmethod
+    def from_pairs(cls, lists_of: array, values: array, size: int) -> Postings:
+        """
+        Put values[j] in list lists_of[j] (of size lists) with one stable
+        counting sort, so every list keeps its values in arrival order
+        """
+        counts = array('I', [0]) * size
+        for i in lists_of:
+            counts[i] += 1
+        offsets = array('I', accumulate(counts, initial=0))
+        cursor = offsets[:-1]
+        packed = array('I', [0]) * len(values)
+        for i, value in zip(lists_of, values):
+            packed[cursor[i]] = value
+            cursor[i] += 1
+        return cls(offsets, packed)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> array:
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+class EPGLookup:
+    """
+    EPG alias table (key → raw EPG ids) behaving like a read-only dict.
+    Every raw id is stored once and referenced by its index; the ids of
+    key slot i are aliases[i], and `order` lists the slots sorted by key
+    for a binary search. Keys iterate in the order they were first added.
+
+    fuzzy() returns exactly what difflib.get_close_matches returns over
+    every key of FUZZY_MIN_LEN characters or more without scoring them
+    all. For every key length, a bitset per character item marks the keys
+    holding it; summing a query's bitsets gives every key's quick_ratio
+    bound at once, and keys are scored best bound first until no
+    remaining key can enter the top n. The index is built on the first
+    fuzzy query, once per lookup
+    """
+
+    def __init__(self, keys: list[str] | None = None, ids: list[str] | None = None,
+                 aliases: Postings | None = None, order: array | None = None):
+        self.keys = keys if keys is not None else []
+        self.ids = ids if ids is not None else []
+        self.aliases = aliases if aliases is not None else Postings()
+        if order is None:
+            order = array('I', sorted(range(len(self.keys)), key=self.keys.__getitem__))
+        self.order = order
+        self._terms: dict[str, int] | None = None
+        self._bitsets = Postings()  # term → bitset or positions over _lengths[la]
+        self._lengths = Postings()  # la → slots of the keys of that length
+        self._lock = threading.Lock()
+        self.snapshot: tuple[str, str] | None = None  # (path, source) once saved or loaded
+
+    def save(self, path: str, source: str) -> None:
+        """
+        Write the lookup, fuzzy index included, as the snapshot of the id
+        list whose sha256 hex digest is source
+        """
+        self._index()
+        strings = ["\n".join(items).encode() for items in (self.ids, self.keys, self._terms)]
+        arrays = [self.aliases.offsets, self.aliases.values, self.order,
+                  self._bitsets.offsets, self._bitsets.values,
+                  self._lengths.offsets, self._lengths.values]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, EPG_SNAPSHOT_FORMAT, bytes.fromhex(source),
+                                            *map(len, strings), *map(len, arrays)))
+            for blob in strings:
+                file.write(blob)
+            file.write(bytes(-file.tell() % SNAPSHOT_ITEMSIZE))
+            for values in arrays:
+                file.write(memoryview(values).cast("B"))
+        os.replace(tmp_path, path)
+        self.snapshot = (path, source)
+
+    @classmethod
+    def load(cls, path: str, source: str) -> EPGLookup | None:
+        """
+        Map a snapshot written by save() back in, or None if there is no
+        snapshot of that id list in this format. Only the strings are
+        decoded; the arrays are read in place from the mapping
+        """
+        try:
+            with open(path, "rb") as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):  # missing or empty
+            return None
+        sections = _snapshot_sections(mapped, source)
+        if sections is None:
+            mapped.close()
+            return None
+
+        view = memoryview(mapped)
+        strings = [str(view[start:end], "utf-8").split("\n") if end > start else []
+                   for start, end in sections[:SNAPSHOT_STRINGS]]
+        arrays = [view[start:end].cast("I") for start, end in sections[SNAPSHOT_STRINGS:]]
+        ids, keys, terms = strings
+        lookup = cls(keys, ids, Postings(arrays[0], arrays[1]), arrays[2])
+        lookup._terms = {term: i for i, term in enumerate(terms)}
+        lookup._bitsets = Postings(arrays[3], arrays[4])
+        lookup._lengths = Postings(arrays[5], arrays[6])
+        lookup.snapshot = (path, source)
+        return lookup
+
+    def _slot(self, key: str) -> int:
+        i = bisect_left(self.order, key, key=self.keys.__getitem__)
+        if i < len(self.order) and self.keys[self.order[i]] == key:
+            return self.order[i]
+        return -1
+
+    def __contains__(self, key: str) -> bool:
+        return self._slot(key) >= 0
+
+    def __getitem__(self, key: str) -> list[str]:
+        slot = self._slot(key)
+        if slot < 0:
+            raise KeyError(key)
+        return [self.ids[i] for i in self.aliases[slot]]
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def prepare(self) -> None:
+        """Build the fuzzy index now rather than on the first fuzzy query"""
+        self._index()
+
+    def _index(self) -> dict[str, int]:
+        with self._lock:
+            if self._terms is None:
+                logging.info(f"🔠 Building fuzzy index over {len(self.keys)} EPG keys...")
+                by_length: dict[int, list[int]] = defaultdict(list)
+                for slot, key in enumerate(self.keys):
+                    if len(key) >= FUZZY_MIN_LEN:
+                        by_length[len(key)].append(slot)
+
+                terms, bitsets = {}, []
+                for la, slots in sorted(by_length.items()):
+                    keys = [self.keys[slot] for slot in slots]
+                    nwords = -(-len(slots) // 32)
+                    for c, counts in _char_counts(keys, la):
+                        r = 1  # item c * r: the keys holding c at least r times
+                        while mask := int(counts.translate(b"0" * r + b"1" * (256 - r))[::-1], 2):
+                            # a bitset of nwords, or the positions when fewer
+                            if mask.bit_count() < nwords:
+                                values = array('I', _set_bits(mask, len(slots) + 7 >> 3))
+                            else:
+                                values = array('I')
+                                values.frombytes(mask.to_bytes(nwords * 4, "little"))
+                            terms[f"{la} {c * r}"] = len(bitsets)
+                            bitsets.append(values)
+                            r += 1
+
+                self._bitsets = Postings.from_lists(bitsets)
+                self._lengths = Postings.from_lists(
+                    [by_length.get(la, []) for la in range(max(by_length, default=0) + 1)])
+                self._terms = terms
+                logging.info(f"✅ Fuzzy index built: {len(terms)} terms")
+            return self._terms
+
+    def _term_mask(self, term: int, size: int) -> int:
+        """Bit i set when key i of its length holds the term's item"""
+        values = self._bitsets[term]
+        if len(values) == -(-size // 32):
+            return int.from_bytes(values, "little")
+        bits = bytearray(size + 7 >> 3)
+        for pos in values:
+            bits[pos >> 3] |= 1 << (pos & 7)
+        return int.from_bytes(bits, "little")
+
+    def fuzzy(self, query: str, n: int = 3, cutoff: float = 0.65) -> list[str]:
+        """
+        Up to n keys whose difflib ratio to query is at least cutoff, best
+        first, ties by key descending: difflib.get_close_matches(query,
+        keys of FUZZY_MIN_LEN or more, n, cutoff), same result and order.
+
+        A key of length la sharing I characters with the query has ratio
+        at most 2*I/(la+lb), difflib's quick_ratio. Per key length the
+        query's item bitsets are added bit-sliced (counter planes as big
+        ints), which gives I for every key of that length in a few big-int
+        operations. The (la, I) tiers are then scored in falling bound
+        order, and the search stops at the first tier whose bound is below
+        the n-th best ratio found so far
+        """
+        if n <= 0:
+            raise ValueError(f"n must be > 0: {n!r}")
+        if cutoff <= 0:  # every key passes, nothing to prune
+            candidates = [key for key in self.keys if len(key) >= FUZZY_MIN_LEN]
+            return difflib.get_close_matches(query, candidates, n, cutoff)
+
+        terms = self._index()
+        items = _char_items(query)
+        lb = len(query)
+        # real_quick_ratio 2*min(la, lb)/(la+lb) bounds the usable key lengths
+        shortest = max(FUZZY_MIN_LEN, math.floor(cutoff * lb / (2 - cutoff)))
+        longest = min(math.ceil(lb * (2 - cutoff) / cutoff), len(self._lengths) - 1)
+
+        planes: dict[int, list[int]] = {}
+        tiers = []
+        for la in range(shortest, longest + 1):
+            need = next((i for i in range(min(la, lb) + 1) if 2.0 * i / (la + lb) >= cutoff), None)
+            if need is None or not self._lengths[la]:
+                continue
+            counter: list[int] = []  # bit i of every key's shared count
+            for item in items:
+                term = terms.get(f"{la} {item}")
+                if term is None:
+                    continue
+                carry = self._term_mask(term, len(self._lengths[la]))
+                for i, plane in enumerate(counter):
+                    counter[i], carry = plane ^ carry, plane & carry
+                    if not carry:
+                        break
+                if carry:
+                    counter.append(carry)
+            planes[la] = counter
+            most = min(la, lb, (1 << len(counter)) - 1)
+            tiers.extend((2.0 * shared / (la + lb), la, shared) for shared in range(most, need - 1, -1))
+        tiers.sort(reverse=True)
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        best: list[tuple[float, str]] = []  # min-heap of the n best (ratio, key)
+        for bound, la, shared in tiers:
+            if len(best) == n and bound < best[0][0]:
+                break
+            slots = self._lengths[la]
+            full = (1 << len(slots)) - 1
+            mask = full
+            for i, plane in enumerate(planes[la]):
+                mask &= plane if shared >> i & 1 else full ^ plane
+                if not mask:
+                    break
+            if not mask:
+                continue
+            for pos in _set_bits(mask, (len(slots) + 7) // 8):
+                key = self.keys[slots[pos]]
+                matcher.set_seq1(key)
+                ratio = matcher.ratio()
+                if ratio >= cutoff:
+                    if len(best) < n:
+                        heapq.heappush(best, (ratio, key))
+                    else:
+                        heapq.heappushpop(best, (ratio, key))
+        return [key for _, key in sorted(best, reverse=True)]
+
 # ── ENHANCED EPG lookup build ──────────────────────────────────────────────
 
-def build_epg_lookup(lines: list[str]) -> dict[str, list[str]]:
+def build_epg_lookup(lines: list[str]) -> EPGLookup:
     """
     ENHANCED EPG lookup table builder with progress tracking
     For every EPG line create MANY aliases, so
@@ -214,44 +596,53 @@ def build_epg_lookup(lines: list[str]) -> dict[str, list[str]]:
     All aliases also exist with the country suffix: "… uk".
     """
     logging.info("📋 Building EPG lookup table...")
-    table: dict[str, list[str]] = defaultdict(list)
+    ids: list[str] = []  # raw EPG ids, referenced by index
+    slots: dict[str, int] = {}  # alias key → slot, in first-seen order
+    # one (key slot, id index) pair per alias, grouped by slot at the end
+    pair_slots, pair_ids = array('I'), array('I')
 
-    processed = 0
     for line in tqdm(lines, desc="Processing EPG entries", disable=not logging.getLogger().isEnabledFor(logging.INFO)):
         raw = line.strip()
         if not raw or raw.startswith("#"):
             continue
 
-        processed += 1
+        idx = len(ids)
+        ids.append(raw)
+        keys: list[str] = []
 
         # split "… .uk" or keep whole line if no country code
         parts = raw.split(".")
         country = parts[-1].lower() if len(parts) > 1 and len(parts[-1]) == 2 else None
         brand = parts[:-1] if country else parts  # every block except cc
         brand_sp = " ".join(brand)  # dotted → spaced words
-        brand_cl = re.sub(r"[^a-z0-9 ]", " ", brand_sp.lower())
-        brand_cl = re.sub(r"\s+", " ", brand_cl).strip()  # normalised
+        words = ALIAS_WORD_RE.findall(brand_sp.lower())  # normalised
 
         # progressive prefixes: "tnt sports 4 hd" → full, drop "hd", drop "4", …
-        words = brand_cl.split()
         for i in range(len(words), 0, -1):
             frag = " ".join(words[:i])
             for key in (frag, frag.replace(" ", "")):  # spaced and slug form
-                table[key].append(raw)
+                keys.append(key)
                 if country:
-                    table[f"{key}.{country}"].append(raw)
+                    keys.append(f"{key}.{country}")
 
         # original full lower-cased line for safety
-        table[raw.lower()].append(raw)
+        keys.append(raw.lower())
 
         # Add progressive prefixes for better matching
         if len(parts) > 1:
             for i in range(1, len(parts)):
-                partial = '.'.join(parts[:i]).lower()
-                table[partial].append(raw)
+                keys.append('.'.join(parts[:i]).lower())
 
-    logging.info(f"✅ EPG lookup built: {len(table)} unique keys from {processed} entries")
-    return table
+        pair_slots.extend([slots.setdefault(key, len(slots)) for key in keys])
+        pair_ids.extend([idx] * len(keys))
+
+    aliases = Postings.from_pairs(pair_slots, pair_ids, len(slots))
+    del pair_slots, pair_ids
+    # slots in key order straight from the dict: no boxed int per key
+    order = array('I', map(slots.__getitem__, sorted(slots)))
+    lookup = EPGLookup(list(slots), ids, aliases, order)
+    logging.info(f"✅ EPG lookup built: {len(lookup)} unique keys from {len(ids)} entries")
+    return lookup
 
 # ── ENHANCED brand variation generator ─────────────────────────────────────
 
@@ -333,7 +724,7 @@ def _best_by_country(matches: list[str], prefer: str | None) -> str:
 
 # ── ENHANCED EPG match with better fallback prevention ─────────────────────
 
-def find_best_epg_match(channel_name: str, lookup: dict[str, list[str]]) -> str:
+def find_best_epg_match(channel_name: str, lookup: EPGLookup) -> str:
     """
     ENHANCED EPG matching with better fallback logic to prevent incorrect matches
     """
@@ -372,18 +763,8 @@ def find_best_epg_match(channel_name: str, lookup: dict[str, list[str]]) -> str:
             logging.debug(f"✅ EPG: Key match '{key}' -> '{best_match}'")
             return best_match
 
-    # Enhanced fuzzy matching with country awareness
-    candidates = []
-    for lookup_key in lookup:
-        if len(lookup_key) >= 3:
-            # Prefer candidates from the same country
-            if country != 'unknown' and lookup_key.endswith(f'.{country}'):
-                candidates.insert(0, lookup_key)  # Add to front
-            else:
-                candidates.append(lookup_key)
-
-    # Try fuzzy matching with brand name
-    fuzzy_matches = difflib.get_close_matches(slug, candidates, n=3, cutoff=0.65)
+    # Fuzzy matching over every alias, country preference applied below
+    fuzzy_matches = lookup.fuzzy(slug, n=3, cutoff=0.65)
     if fuzzy_matches:
         # Collect all matches from fuzzy results
         all_matches = []
@@ -582,62 +963,97 @@ def extract_channel_ids(schedule) -> set[str]:
 
 # ═════ ENHANCED stream validation ══════════════════════════════════════════
 
-def validate_single(url: str) -> str | None:
+def probe_status(url: str) -> ProbeResult | None:
     """
-    Validate single stream URL with retry logic
+    Probe a stream URL with retry logic, reading at most MANIFEST_BYTES of
+    it. Returns a ProbeResult with status 200 and the manifest timings for
+    a working stream, 404/410 (or 0 after network errors or a body that is
+    not an HLS playlist) for a dead one and None when the result is
+    inconclusive
     """
+    result = None
     for attempt in range(3):
         try:
-            r = requests.head(url, headers=HEADERS, timeout=10, allow_redirects=True)
-            if r.status_code == 200:
-                return url
-            if r.status_code in (404, 410):
-                return None
-            if r.status_code == 429:
-                time.sleep(5)
-                continue
-
-            # Try GET if HEAD fails
-            r = requests.get(url, headers=HEADERS, timeout=10, stream=True)
-            if r.status_code == 200:
-                return url
-            if r.status_code in (404, 410):
-                return None
-
+            LIMITER.acquire(url)
+            m = fetch_manifest(url, SESSION, HEADERS)
         except requests.RequestException:
+            HEALTH.record(url, 0)
+            result = ProbeResult(0)
+            continue
+        HEALTH.record(url, m.status, m.ttfb)
+        if m.status == 429:
+            LIMITER.throttled(url, m.retry_after)
+            result = None
             continue
-    return None
+        LIMITER.success(url)
+        if m.status == 200:
+            # timings kept so all_channels/main.py can rank mirrors from the shared cache
+            return ProbeResult(200, m.latency, m.ttfb)
+        if m.status in (0, 404, 410):
+            return ProbeResult(m.status)
+        result = None
+    return result
+
+def validate_single(url: str) -> str | None:
+    """
+    Validate single stream URL, answering from the shared result cache
+    while the last check of the URL is still fresh
+    """
+    result = CACHE.lookup(url)
+    if result is None:
+        result = probe_status(url)
+        if result is None:
+            return None
+        CACHE.store(url, result)
+    return url if result.status == 200 else None
+
+def probe_channel(channel_id: str, templates: list[str] = URL_TEMPLATES) -> tuple[str | None, int]:
+    """
+    Try the mirrors of one channel in the given order, stopping at the
+    first one that works. Returns (working URL or None, URLs probed).
+    """
+    for tried, tpl in enumerate(templates, 1):
+        url = validate_single(tpl.format(num=channel_id))
+        if url:
+            return url, tried
+    return None, len(templates)
 
 def build_stream_map(ids: set[str], workers: int = 30) -> dict[str, str]:
     """
     ENHANCED stream map builder with progress tracking
+    Channels are probed in parallel; the mirrors of each channel are tried
+    in order and the remaining ones are skipped once one answers.
     """
     logging.info(f"🌐 Validating streams for {len(ids)} channels using {workers} workers...")
-
-    # Generate all possible URLs
-    cand = {tpl.format(num=i): i for i in ids for tpl in URL_TEMPLATES}
-    logging.info(f"🔗 Generated {len(cand)} candidate URLs to test")
+    # Best scoring mirrors first, currently dead ones not at all
+    templates = HEALTH.order(URL_TEMPLATES)
+    for tpl in URL_TEMPLATES:
+        if tpl not in templates:
+            logging.info(f"💀 Skipping dead mirror {tpl.split('/')[2]}")
+    logging.info(f"🔗 Up to {len(ids) * len(templates)} candidate URLs to test")
 
     id2url: dict[str, str] = {}
-    failed_count = 0
+    failed_count = probed = 0
 
     with ThreadPoolExecutor(workers) as pool:
-        # Submit all validation tasks
-        futs = {pool.submit(validate_single, u): u for u in cand}
+        # One task per channel
+        futs = {pool.submit(probe_channel, i, templates): str(i) for i in ids}
 
         # Process results with progress bar
         with tqdm(total=len(futs), desc="Validating streams", disable=not logging.getLogger().isEnabledFor(logging.INFO)) as pbar:
             for fut in as_completed(futs):
-                url = fut.result()
+                url, tried = fut.result()
+                probed += tried
                 if url:
-                    channel_id = str(cand[futs[fut]])
-                    id2url.setdefault(channel_id, url)
+                    id2url[futs[fut]] = url
                     pbar.set_postfix_str(f"✅ {len(id2url)} working")
                 else:
                     failed_count += 1
                     pbar.set_postfix_str(f"❌ {failed_count} failed, ✅ {len(id2url)} working")
                 pbar.update(1)
 
+    logging.info(f"🔗 Probed {probed} URLs")
+    logging.info(f"🩺 Mirror health:\n{HEALTH.report()}")
     success_rate = len(id2url) / len(ids) * 100 if ids else 0
     logging.info(f"✅ Stream validation complete: {len(id2url)}/{len(ids)} channels ({success_rate:.1f}% success rate)")
 
@@ -649,15 +1065,78 @@ def build_stream_map(ids: set[str], workers: int = 30) -> dict[str, str]:
 
     return id2url
 
+# ═════ ENHANCED channel resolution ═════════════════════════════════════════
+
+RESOLVE_PARALLEL_MIN = 64   # fewer unique channels are resolved in-process
+
+# (epg_lookup, logos) of the resolver, set per worker by _resolve_init
+_RESOLVE_CONTEXT = None
+
+def _resolve_init(snapshot: tuple[str, str], logos: dict[str, str], level: int, fmt: str | None) -> None:
+    """Worker initializer: map the parent's EPG snapshot, log like the parent"""
+    global _RESOLVE_CONTEXT
+    logging.basicConfig(level=level, format=fmt, datefmt="%H:%M:%S")
+    epg_lookup = EPGLookup.load(*snapshot)
+    if epg_lookup is None:
+        raise RuntimeError(f"EPG snapshot {snapshot[0]} is gone or changed")
+    _RESOLVE_CONTEXT = (epg_lookup, logos)
+
+def _resolve_channel(channel: tuple[str, str]) -> tuple[tuple[str, str], str, str]:
+    cid, cname = channel
+    epg_lookup, logos = _RESOLVE_CONTEXT
+    return channel, find_best_epg_match(cname, epg_lookup), find_best_logo(cname, logos)
+
+def resolve_channels(channels: set[tuple[str, str]], epg_lookup, logos,
+                     workers: int | None = None) -> dict[tuple[str, str], tuple[str, str]]:
+    """
+    Resolve the EPG match and logo of every unique (channel id, channel name)
+    once, across all cores when there are enough of them. Worker processes
+    are spawned, not forked from this threaded process, and map the lookup's
+    snapshot, so they share its pages instead of pickling it; a lookup
+    without a snapshot is resolved sequentially
+    Returns {(cid, cname): (EPG match or "", logo URL)}
+    """
+    global _RESOLVE_CONTEXT
+    workers = workers or os.cpu_count() or 1
+    parallel = workers > 1 and len(channels) >= RESOLVE_PARALLEL_MIN and epg_lookup.snapshot is not None
+    logging.info(f"🧭 Resolving {len(channels)} unique channels "
+                 f"({f'{workers} processes' if parallel else 'sequentially'})...")
+
+    started = time.monotonic()
+    _RESOLVE_CONTEXT = (epg_lookup, logos)
+    try:
+        ordered = sorted(channels)
+        results = None
+        if parallel:
+            root = logging.getLogger()
+            fmt = root.handlers[0].formatter._fmt if root.handlers and root.handlers[0].formatter else None
+            try:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_resolve_init,
+                                         initargs=(epg_lookup.snapshot, logos, root.level, fmt)) as pool:
+                    results = list(pool.map(_resolve_channel, ordered,
+                                            chunksize=max(1, len(ordered) // (workers * 4))))
+            except BrokenProcessPool as e:
+                logging.warning(f"⚠️  Resolver processes failed ({e}), resolving sequentially")
+        if results is None:
+            results = [_resolve_channel(ch) for ch in ordered]
+    finally:
+        _RESOLVE_CONTEXT = None
+
+    table = {channel: (tvg_id, logo) for channel, tvg_id, logo in results}
+    epg_hits = sum(1 for (cid, _), (tvg_id, _) in table.items() if tvg_id and tvg_id != cid)
+    logo_hits = sum(1 for _, logo in table.values() if not logo.endswith('no-logo.png'))
+    logging.info(f"✅ Resolved {len(table)} channels in {time.monotonic() - started:.2f}s: "
+                 f"{epg_hits} EPG matches, {logo_hits} logos")
+    return table
+
 # ═════ ENHANCED main playlist build ════════════════════════════════════════
 
 def make_playlist(schedule, streams, logos, epg_lookup):
     """
     ENHANCED playlist generation with detailed statistics and better fallback handling
     """
-    logging.info("📝 Generating M3U playlist...")
-
-    lines = ["#EXTM3U", f'#EXTM3U url-tvg="{EPG_XML_URL}"']
+    logging.info(f"📝 Generating M3U playlist {OUTPUT_FILE}...")
 
     # Group events by category
     grouped = defaultdict(list)
@@ -667,67 +1146,70 @@ def make_playlist(schedule, streams, logos, epg_lookup):
 
     logging.info(f"📊 Processing {len(grouped)} categories")
 
+    # Every (channel id, name) pair is matched once, however many events show it
+    channels = {(_extract_cid(ch), ch["channel_name"] if isinstance(ch, dict) else str(ch))
+                for events in grouped.values() for ev in events for ch in _channel_entries(ev)}
+    resolved = resolve_channels({ch for ch in channels if streams.get(ch[0])}, epg_lookup, logos)
+
     total = epg_ok = logo_ok = 0
     channel_stats = defaultdict(int)
     category_stats = defaultdict(int)
     country_stats = defaultdict(int)
 
-    for group in sorted(grouped):
-        group_items = 0
-        logging.info(f"📁 Processing category: {group}")
-
-        for ev in tqdm(grouped[group], desc=f"Processing {group}", leave=False, disable=not logging.getLogger().isEnabledFor(logging.INFO)):
-            title = ev["event"]
+    # Entries are streamed to disk as they are built; the file replaces
+    # OUTPUT_FILE only once the whole playlist has been written
+    with m3u.Writer(OUTPUT_FILE, header=("#EXTM3U", f'#EXTM3U url-tvg="{EPG_XML_URL}"')) as playlist:
+        for group in sorted(grouped):
+            group_items = 0
+            logging.info(f"📁 Processing category: {group}")
 
-            for ch in _channel_entries(ev):
-                # Use the API channel name directly
-                cname = ch["channel_name"] if isinstance(ch, dict) else str(ch)
-                cid = _extract_cid(ch)
-                url = streams.get(cid)
+            for ev in tqdm(grouped[group], desc=f"Processing {group}", leave=False, disable=not logging.getLogger().isEnabledFor(logging.INFO)):
+                title = ev["event"]
 
-                if not url:
-                    logging.debug(f"⚠️  No stream URL for channel {cid} ({cname})")
-                    continue
-
-                total += 1
-                group_items += 1
-                channel_stats[cname] += 1
-
-                # ENHANCED EPG matching with better fallback handling
-                tvg_id = find_best_epg_match(cname, epg_lookup)
-                if not tvg_id:  # If no match found, use channel ID as fallback
-                    tvg_id = cid
-                    logging.debug(f"⚠️  Using channel ID as fallback: {cname} -> {cid}")
-                elif tvg_id != cid:
-                    epg_ok += 1
-                    logging.debug(f"✅ EPG matched: {cname} -> {tvg_id}")
-
-                    # Track country distribution
-                    if '.' in tvg_id:
-                        country_part = tvg_id.split('.')[-1]
-                        if len(country_part) == 2:  # Country code
-                            country_stats[country_part] += 1
-
-                # ENHANCED logo matching
-                logo = find_best_logo(cname, logos)
-                if not logo.endswith('no-logo.png'):
-                    logo_ok += 1
-
-                lines.append(
-                    f'#EXTINF:-1 tvg-id="{tvg_id}" tvg-logo="{logo}" '
-                    f'group-title="{group}",{title} ({cname})'
-                )
-
-                lines.extend(VLC_HEADERS)
-                lines.append(f"{PROXY_PREFIX}{base64.b64encode(url.encode()).decode()}.m3u8")
-
-        category_stats[group] = group_items
-        logging.info(f"✅ {group}: {group_items} items processed")
-
-    # Write playlist file
-    logging.info(f"💾 Writing playlist to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as fp:
-        fp.write('\n'.join(lines) + '\n')
+                for ch in _channel_entries(ev):
+                    # Use the API channel name directly
+                    cname = ch["channel_name"] if isinstance(ch, dict) else str(ch)
+                    cid = _extract_cid(ch)
+                    url = streams.get(cid)
+
+                    if not url:
+                        logging.debug(f"⚠️  No stream URL for channel {cid} ({cname})")
+                        continue
+
+                    total += 1
+                    group_items += 1
+                    channel_stats[cname] += 1
+
+                    # ENHANCED EPG matching with better fallback handling
+                    tvg_id, logo = resolved[(cid, cname)]
+                    if not tvg_id:  # If no match found, use channel ID as fallback
+                        tvg_id = cid
+                        logging.debug(f"⚠️  Using channel ID as fallback: {cname} -> {cid}")
+                    elif tvg_id != cid:
+                        epg_ok += 1
+                        logging.debug(f"✅ EPG matched: {cname} -> {tvg_id}")
+
+                        # Track country distribution
+                        if '.' in tvg_id:
+                            country_part = tvg_id.split('.')[-1]
+                            if len(country_part) == 2:  # Country code
+                                country_stats[country_part] += 1
+
+                    # ENHANCED logo matching
+                    if not logo.endswith('no-logo.png'):
+                        logo_ok += 1
+
+                    playlist.write(m3u.Entry.build(
+                        f"{title} ({cname})",
+                        f"{PROXY_PREFIX}{base64.b64encode(url.encode()).decode()}.m3u8",
+                        {"tvg-id": tvg_id, "tvg-logo": logo, "group-title": group},
+                        VLC_HEADERS,
+                    ))
+
+            category_stats[group] = group_items
+            logging.info(f"✅ {group}: {group_items} items processed")
+
+    logging.info(f"💾 Playlist written to {OUTPUT_FILE}")
 
     # Calculate and log comprehensive statistics
     epg_pct = epg_ok / total * 100 if total else 0
@@ -759,22 +1241,37 @@ def make_playlist(schedule, streams, logos, epg_lookup):
 def download_epg_lookup(sess: requests.Session):
     """
     Download EPG lookup with enhanced error handling
+    The id list is revalidated through the HTTP cache; while it is unchanged
+    the lookup built from it is mapped from EPG_SNAPSHOT instead of rebuilt
     """
     logging.info("📡 Downloading EPG ID list...")
     try:
-        r = sess.get(EPG_IDS_URL, timeout=30)
-        r.raise_for_status()
-        txt = r.text
-
-        lines = txt.splitlines()
+        path = HTTP_CACHE.fetch(EPG_IDS_URL, session=sess, timeout=30)
+        if path is None:
+            raise requests.HTTPError(f"no usable response from {EPG_IDS_URL}")
+        source = HTTP_CACHE.content_hash(EPG_IDS_URL)
+
+        lookup = EPGLookup.load(EPG_SNAPSHOT, source)
+        if lookup is not None:
+            logging.info(f"⚡ EPG lookup mapped from snapshot: {len(lookup)} unique keys "
+                         f"from {len(lookup.ids)} entries")
+            return lookup
+
+        with open(path, encoding="utf-8", errors="replace") as file:
+            lines = file.read().splitlines()
         logging.info(f"📄 Downloaded {len(lines)} EPG entries")
 
         lookup = build_epg_lookup(lines)
+        try:
+            lookup.save(EPG_SNAPSHOT, source)
+            logging.info(f"💾 EPG lookup snapshot saved to {EPG_SNAPSHOT}")
+        except OSError as e:
+            logging.warning(f"⚠️  Could not save EPG lookup snapshot: {e}")
         return lookup
 
     except Exception as e:
         logging.error(f"❌ EPG list download failed: {e}")
-        return {}
+        return EPGLookup()
 
 # ═════ ENHANCED main entry point ══════════════════════════════════════════
 
@@ -811,7 +1308,28 @@ Examples:
         help="Number of worker threads for stream validation (default: 30)"
     )
 
+    ap.add_argument(
+        "--positive-ttl",
+        type=float,
+        default=CACHE.positive_ttl,
+        help=f"Seconds a cached working stream is trusted (default: {CACHE.positive_ttl:.0f})"
+    )
+    ap.add_argument(
+        "--negative-ttl",
+        type=float,
+        default=CACHE.negative_ttl,
+        help=f"Seconds a cached dead stream is trusted (default: {CACHE.negative_ttl:.0f})"
+    )
+    ap.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Probe every stream, ignoring and not updating the result cache"
+    )
+
     args = ap.parse_args()
+    CACHE.positive_ttl = args.positive_ttl
+    CACHE.negative_ttl = args.negative_ttl
+    CACHE.enabled = not args.no_cache
 
     # Configure logging based on arguments
     if args.quiet:
@@ -841,7 +1359,11 @@ Examples:
         # Main workflow with enhanced error handling
         schedule = get_schedule()
         ids = extract_channel_ids(schedule)
-        streams = build_stream_map(ids, workers=args.workers)
+        try:
+            streams = build_stream_map(ids, workers=args.workers)
+        finally:
+            CACHE.close()
+            HEALTH.close()
 
         with requests.Session() as s:
             logos = build_logo_index(s)
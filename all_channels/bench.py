@@ -0,0 +1,207 @@
+# bench.py – micro-benchmarks for the scraping hot paths in all_channels/
+#
+#   python all_channels/bench.py extract [PAGE ...] [-n RUNS]
+#   python all_channels/bench.py parse [HOMEPAGE ...] [-n RUNS]
+#
+# Every benchmark checks that the new code returns the same result as the
+# code it replaced before timing both. Without saved pages synthetic ones
+# are generated: a JS-heavy embed page, a streambtw homepage.
+
+import argparse
+import base64
+import binascii
+import random
+import re
+import string
+import time
+
+from bs4 import BeautifulSoup
+
+from m3u8_extract import extract_m3u8
+import streambtw
+
+# -----------------------------------------------------------------------------
+
+# m3u8 extraction
+
+# -----------------------------------------------------------------------------
+
+def legacy_extract(text):
+    """ppv.extract_m3u8_flexible as it was before m3u8_extract."""
+    if not text:
+        return None
+    clean_text = text.replace(r"\/", "/")
+    url_pattern = r'(https?://[^\s"\'<>]+?\.m3u8(?:[\?&][^\s"\'<>]*)?)'
+    match = re.search(url_pattern, clean_text)
+    if match:
+        return match.group(1)
+    for candidate in re.findall(r'"([a-zA-Z0-9+/=]{20,})"', clean_text):
+        try:
+            decoded_str = base64.b64decode(candidate).decode('utf-8', errors='ignore')
+            if ".m3u8" in decoded_str:
+                b64_match = re.search(url_pattern, decoded_str)
+                if b64_match:
+                    return b64_match.group(1)
+        except (binascii.Error, UnicodeDecodeError):
+            continue
+    return None
+
+def legacy_streambtw_extract(text):
+    """streambtw.extract_m3u8_from_iframe's matching before m3u8_extract."""
+    m3u8_match = re.search(r'https?://[^\s"\']+\.m3u8[^\s"\'>]*', text)
+    if m3u8_match:
+        return m3u8_match.group(0)
+    m3u8_match = re.search(r'["\']([^"\'\s]+\.m3u8[^"\'\s]*)["\']', text)
+    if m3u8_match and not m3u8_match.group(1).startswith('http'):
+        return m3u8_match.group(1)
+    return None
+
+def synthetic_embed_page(tokens=5000, hidden=True, seed=1):
+    """An embed page full of quoted base64-looking tokens (bundled JS,
+    inline images, tracking ids) with the stream URL base64-encoded near
+    the end, or in plain JSON-escaped form when hidden is False."""
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + "+/"
+    url = "https://cdn.example.net/live/abc123/index.m3u8?token=" + "".join(rng.choices(string.hexdigits, k=32))
+    parts = ["<html><head><script>var cfg = {"]
+    for i in range(tokens):
+        token = "".join(rng.choices(alphabet, k=rng.randint(20, 120)))
+        parts.append(f'"k{i}": "{token}", "p{i}": "{token[:8]}\\/{token[8:]}",')
+        if i == tokens * 9 // 10:
+            if hidden:
+                parts.append(f'"src": "{base64.b64encode(url.encode()).decode()}",')
+            else:
+                parts.append(f'"src": "{url.replace("/", chr(92) + "/")}",')
+    parts.append("};</script></head><body></body></html>")
+    return "\n".join(parts), url
+
+def bench(fn, pages, runs):
+    started = time.perf_counter()
+    for _ in range(runs):
+        for page in pages:
+            fn(page)
+    return (time.perf_counter() - started) / (runs * len(pages))
+
+def bench_extract(args):
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                pages.append(f.read())
+        label = f"{len(pages)} captured pages"
+    else:
+        pages = [synthetic_embed_page(hidden=True)[0], synthetic_embed_page(hidden=False, seed=2)[0]]
+        label = "2 synthetic 5000-token pages"
+
+    for page in pages:
+        expected, got = legacy_extract(page), extract_m3u8(page)
+        assert got == expected, f"result differs: {got!r} != {expected!r}"
+        # streambtw mode finds base64-hidden URLs the old streambtw code missed
+        expected = legacy_streambtw_extract(page)
+        if expected is not None:
+            got = extract_m3u8(page, relative=True, tail=True)
+            assert got == expected, f"streambtw result differs: {got!r} != {expected!r}"
+
+    old = bench(legacy_extract, pages, args.runs)
+    new = bench(extract_m3u8, pages, args.runs)
+    print(f"m3u8 extraction over {label}, {args.runs} runs")
+    print(f"  legacy        {old * 1000:8.2f} ms/page")
+    print(f"  m3u8_extract  {new * 1000:8.2f} ms/page   ({old / new:.1f}x)")
+
+# -----------------------------------------------------------------------------
+
+# streambtw homepage parsing
+
+# -----------------------------------------------------------------------------
+
+def legacy_parse_events(html_content):
+    """streambtw.parse_events as it was before the card-only parse."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    events = []
+    for card in soup.find_all('div', class_='card'):
+        category = card.find('h5', class_='card-title')
+        category = category.text.strip() if category else "Unknown"
+        event_name = card.find('p', class_='card-text')
+        event_name = event_name.text.strip() if event_name else "Unknown Event"
+        link = card.find('a', class_='btn btn-primary')
+        if link and 'href' in link.attrs:
+            iframe_url = link['href']
+            if not iframe_url.startswith('http'):
+                iframe_url = f"https://streambtw.com{iframe_url}"
+        else:
+            iframe_url = None
+        logo = card.find('img', class_='league-logo')
+        logo_url = logo['src'] if logo and 'src' in logo.attrs else ""
+        if iframe_url:
+            events.append({'category': category, 'name': event_name,
+                           'iframe_url': iframe_url, 'logo': logo_url})
+    return events
+
+def synthetic_homepage(cards=60, seed=1):
+    """A streambtw-like homepage: navigation, inline scripts and promo
+    blocks around a grid of event cards."""
+    rng = random.Random(seed)
+    leagues = ["NBA", "NFL", "NHL", "MLB", "Soccer", "UFC", "Boxing", "F1"]
+    parts = ["<!DOCTYPE html><html><head><title>StreamBTW</title>",
+             "<script>" + "var x=" + "1+" * 3000 + "1;</script></head><body>",
+             "<nav>" + "".join(f'<a class="nav-link" href="/p{i}">Page {i}</a>' for i in range(40)) + "</nav>",
+             '<div class="container"><div class="row">']
+    for i in range(cards):
+        league = rng.choice(leagues)
+        parts.append(
+            f'<div class="col-md-4"><div class="card mb-3">'
+            f'<img class="league-logo" src="/logos/{league.lower()}.png" alt="{league}">'
+            f'<div class="card-body"><h5 class="card-title">{league}</h5>'
+            f'<p class="card-text">Team {rng.randint(1, 99)} vs Team {rng.randint(1, 99)}</p>'
+            f'<a class="btn btn-primary" href="/iframe/{i}.php">Watch</a></div></div></div>')
+        if i % 6 == 5:
+            parts.append('<div class="promo"><p>' + "Lorem ipsum dolor sit amet. " * 40 + "</p></div>")
+    parts.append("</div></div><footer>" + "<p>footer</p>" * 50 + "</footer></body></html>")
+    return "".join(parts)
+
+def bench_parse(args):
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                pages.append(f.read())
+        cases = [(f"{len(pages)} saved homepages", pages)]
+    else:
+        # one page with 20x the cards, not 20 documents glued together
+        cases = [(f"a synthetic {cards}-card homepage", [synthetic_homepage(cards)]) for cards in (60, 1200)]
+
+    parsers = ["html.parser"]
+    try:
+        import lxml  # noqa: F401
+        parsers.append("lxml")
+    except ImportError:
+        print("lxml not installed – skipping the lxml backend")
+
+    print(f"homepage parsing, {args.runs} runs")
+    for label, pages in cases:
+        expected = [legacy_parse_events(page) for page in pages]
+        old = bench(legacy_parse_events, pages, args.runs)
+        print(f"  {label} ({sum(map(len, expected))} cards)")
+        print(f"    legacy (full tree)     {old * 1000:8.2f} ms/page")
+        for parser in parsers:
+            got = [streambtw.parse_events(page, parser) for page in pages]
+            assert got == expected, f"{parser}: events differ from the legacy parse"
+            new = bench(lambda page: streambtw.parse_events(page, parser), pages, args.runs)
+            print(f"    cards only, {parser:<11}{new * 1000:8.2f} ms/page   ({old / new:.1f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the all_channels scrapers")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("extract", help="ppv/streambtw m3u8 extraction")
+    p.add_argument("pages", nargs="*", help="saved embed pages (default: synthetic pages)")
+    p.add_argument("-n", "--runs", type=int, default=20)
+    p.set_defaults(func=bench_extract)
+    p = sub.add_parser("parse", help="streambtw homepage card parsing")
+    p.add_argument("pages", nargs="*", help="saved homepages (default: a synthetic homepage)")
+    p.add_argument("-n", "--runs", type=int, default=5)
+    p.set_defaults(func=bench_parse)
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# m3u8_extract.py – find the stream URL in an embed page, shared by ppv.py
+# and streambtw.py
+
+import base64
+import binascii
+import re
+
+# Absolute .m3u8 URL, also in its JSON-escaped form (https:\/\/…), so the
+# page never has to be copied to unescape it first. The literal "http"
+# prefix lets the regex engine skip ahead with a fast substring search.
+URL_RE = re.compile(r'https?:(?:\\?/){2}[^\s"\'<>]+?\.m3u8(?:[?&][^\s"\'<>]*)?')
+PLAIN_URL_RE = re.compile(r'https?://[^\s"\'<>]+?\.m3u8(?:[?&][^\s"\'<>]*)?')
+# The same up to the last ".m3u8" of the run, keeping whatever follows it
+# (path segments, ;params, #fragments) and not just a query – the pattern
+# streambtw.py has always used
+TAIL_URL_RE = re.compile(r'https?:(?:\\?/){2}[^\s"\']+\.m3u8[^\s"\'>]*')
+PLAIN_TAIL_URL_RE = re.compile(r'https?://[^\s"\']+\.m3u8[^\s"\'>]*')
+# quoted base64 token ("\/" is an escaped "/") and quoted relative path
+B64_TOKEN_RE = re.compile(r'[A-Za-z0-9+/=\\]{20,}')
+RELATIVE_RE = re.compile(r'["\']([^"\'\s]+\.m3u8[^"\'\s]*)["\']')
+
+def b64_signatures(needle):
+    """The base64 characters that encode needle whatever its alignment
+    within a 3-byte group: any base64 text whose decoding contains needle
+    contains one of the returned strings."""
+    signatures = []
+    for offset in range(3):
+        data = bytes(offset) + needle
+        encoded = base64.b64encode(data + bytes(-len(data) % 3)).decode()
+        # keep only the characters whose 6 bits all come from needle
+        signatures.append(encoded[-(-8 * offset // 6):8 * len(data) // 6])
+    return tuple(signatures)
+
+HTTP_SIGNATURES = b64_signatures(b"http")     # "aHR0c", "h0dH", "odHRw"
+M3U8_SIGNATURES = b64_signatures(b".m3u8")
+
+def iter_b64_candidates(text):
+    """Yield, in document order, the quoted base64 tokens of text that may
+    decode to a .m3u8 URL. Only the tokens around an encoded ".m3u8" are
+    looked at, so pages full of other base64 (inline images, bundled JS)
+    cost a few substring searches instead of thousands of decodes."""
+    tokens = {}
+    for signature in M3U8_SIGNATURES:
+        pos = text.find(signature)
+        while pos != -1:
+            start = text.rfind('"', 0, pos) + 1
+            end = text.find('"', pos)
+            if end == -1:
+                break
+            if start and start not in tokens and B64_TOKEN_RE.fullmatch(text, start, end):
+                tokens[start] = text[start:end]
+            pos = text.find(signature, end)
+    for start in sorted(tokens):
+        token = tokens[start].replace("\\/", "/")
+        if "\\" in token or len(token) % 4 or not any(s in token for s in HTTP_SIGNATURES):
+            continue
+        yield token
+
+def decode_m3u8(token, pattern=PLAIN_URL_RE):
+    """Return the first .m3u8 URL in the base64 token, or None."""
+    try:
+        decoded = base64.b64decode(token).decode("utf-8", errors="ignore")
+    except (binascii.Error, ValueError):
+        return None
+    m = pattern.search(decoded)
+    return m.group(0) if m else None
+
+def extract_m3u8(text, relative=False, tail=False):
+    """Return the stream URL in text, or None.
+
+    A plain (or JSON-escaped) absolute .m3u8 URL wins over one hidden in a
+    base64 token, which wins over a quoted relative path (only considered
+    when relative is set). Within each kind the first in the text wins.
+    An absolute URL ends after its ?/& query, or with tail set wherever
+    the text after its last ".m3u8" ends (tokenised /path, ;params, #t=).
+    """
+    if not text:
+        return None
+    m = (TAIL_URL_RE if tail else URL_RE).search(text)
+    if m:
+        return m.group(0).replace("\\/", "/")
+    for token in iter_b64_candidates(text):
+        url = decode_m3u8(token, PLAIN_TAIL_URL_RE if tail else PLAIN_URL_RE)
+        if url:
+            return url
+    if relative:
+        m = RELATIVE_RE.search(text)
+        if m:
+            return m.group(1)
+    return None
@@ -1,13 +1,26 @@
 # main.py – validate links, rebuild direct URLs, rewrite tivimate_playlist.m3u8
 
 import argparse
+import asyncio
+import json
 import logging
+import os
 import re
-import time
+import sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from collections import defaultdict
 import requests
 
+try:
+    import aiohttp
+except ImportError:  # optional – only needed for the asyncio engine
+    aiohttp = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import m3u
+from streamcheck import (HostHealth, HostRateLimiter, ProbeCache, ProbeResult,
+                         fetch_manifest, fetch_manifest_async, make_session)
+
 PREMIUM_RE = re.compile(r'premium(\d+)/mono\.m3u8')
 
 URL_TEMPLATES = [
@@ -20,6 +33,22 @@ URL_TEMPLATES = [
 
 INPUT_PLAYLIST = "tivimate_playlist.m3u8"
 VALID_LINKS_OUT = "links.m3u8"
+BACKUPS_OUT = "backups.json"
+
+PROBE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0',
+    'Origin': 'https://jxoplay.xyz',
+    'Referer': 'https://jxoplay.xyz/'
+}
+
+# shared by every probe, so a 429 slows the whole pool down for that host
+LIMITER = HostRateLimiter()
+# results shared with Events/events.py; only stale URLs are probed again
+CACHE = ProbeCache()
+# rolling per-mirror scores deciding probe order and which hosts to skip
+HEALTH = HostHealth()
+# pooled connections for the thread-pool engine; probes never read past MANIFEST_BYTES
+SESSION = make_session()
 
 # -----------------------------------------------------------------------------
 
@@ -27,76 +56,163 @@ VALID_LINKS_OUT = "links.m3u8"
 
 # -----------------------------------------------------------------------------
 
-def validate_links(src=INPUT_PLAYLIST, out=VALID_LINKS_OUT, workers=10):
+def probe(url):
+    """Return a ProbeResult with status 200 and the manifest timings for a
+    working URL, 404 (or 0 on a network error or a non-playlist body) for a
+    dead one and None when the probe was inconclusive."""
+    log = logging.getLogger("validate_links")
+    for attempt in range(1, 4):
+        try:
+            LIMITER.acquire(url)
+            log.debug("GET %s (try %d)", url, attempt)
+            m = fetch_manifest(url, SESSION, PROBE_HEADERS)
+        except requests.RequestException as e:
+            log.debug("Request error %s: %s", url, e)
+            HEALTH.record(url, 0)
+            return ProbeResult(0)
+        HEALTH.record(url, m.status, m.ttfb)
+        if m.status == 429:
+            log.debug("429 – backing off %s", url)
+            LIMITER.throttled(url, m.retry_after)
+            continue
+        LIMITER.success(url)
+        if m.status == 200:
+            return ProbeResult(200, m.latency, m.ttfb)
+        if m.status in (0, 404):
+            return ProbeResult(m.status)
+    return None
+
+def check(url):
+    """Return the ProbeResult of a working url, or None."""
+    result = CACHE.lookup(url)
+    if result is None:
+        result = probe(url)
+        if result is not None:
+            CACHE.store(url, result)
+    return result if result and result.status == 200 else None
+
+def log_valid(log, url, result):
+    if result.latency is None:
+        log.info("✓ %s", url)
+    else:
+        log.info("✓ %s (ttfb %.0f ms, manifest %.0f ms)", url,
+                 (result.ttfb or 0) * 1000, result.latency * 1000)
+
+def check_all_threads(candidates, workers):
+    log = logging.getLogger("validate_links")
+    valid = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(check, u): u for u in candidates}
+        for fut in as_completed(futures):
+            res = fut.result()
+            if res:
+                valid.append((futures[fut], res))
+                log_valid(log, futures[fut], res)
+    return valid
+
+async def probe_async(session, url):
+    """asyncio twin of probe()."""
+    log = logging.getLogger("validate_links")
+    for attempt in range(1, 4):
+        try:
+            await LIMITER.acquire_async(url)
+            log.debug("GET %s (try %d)", url, attempt)
+            m = await fetch_manifest_async(session, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.debug("Request error %s: %s", url, e)
+            HEALTH.record(url, 0)
+            return ProbeResult(0)
+        HEALTH.record(url, m.status, m.ttfb)
+        if m.status == 429:
+            log.debug("429 – backing off %s", url)
+            LIMITER.throttled(url, m.retry_after)
+            continue
+        LIMITER.success(url)
+        if m.status == 200:
+            return ProbeResult(200, m.latency, m.ttfb)
+        if m.status in (0, 404):
+            return ProbeResult(m.status)
+    return None
+
+async def check_async(session, url):
+    result = CACHE.lookup(url)
+    if result is None:
+        result = await probe_async(session, url)
+        if result is not None:
+            CACHE.store(url, result)
+    return result if result and result.status == 200 else None
+
+async def check_all_async(candidates, concurrency, per_host):
+    """Probe every candidate from one event loop. Connections are pooled
+    and kept alive per host by the connector, and at most `concurrency`
+    probes are in flight at once."""
+    log = logging.getLogger("validate_links")
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host,
+                                     ttl_dns_cache=300, keepalive_timeout=30)
+    timeout = aiohttp.ClientTimeout(total=10)
+    semaphore = asyncio.Semaphore(concurrency)
+    valid = []
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                     headers=PROBE_HEADERS) as session:
+        async def bounded(url):
+            async with semaphore:
+                return url, await check_async(session, url)
+
+        for fut in asyncio.as_completed([bounded(u) for u in candidates]):
+            url, res = await fut
+            if res:
+                valid.append((url, res))
+                log_valid(log, url, res)
+    return valid
+
+def speed_key(result):
+    """Sort key ranking working URLs by manifest fetch time, then TTFB;
+    URLs without timings go last."""
+    inf = float("inf")
+    return (inf if result.latency is None else result.latency,
+            inf if result.ttfb is None else result.ttfb)
+
+def validate_links(src=INPUT_PLAYLIST, out=VALID_LINKS_OUT, workers=10,
+                   engine="async", concurrency=1000, per_host=200):
     log = logging.getLogger("validate_links")
     log.info("Stage 1 ▸ scanning %s", src)
 
-    current_urls = []
-    with open(src, encoding="utf-8") as fin:
-        lines = fin.read().splitlines()
-    i = 0
-    while i < len(lines):
-        if lines[i].startswith("#EXTINF") and i + 1 < len(lines):
-            stream = lines[i + 1].strip()
-            if PREMIUM_RE.search(stream):
-                current_urls.append(stream)
-                log.debug("found ⇒ %s", stream)
-            i += 2
-        else:
-            i += 1
-
-    ids = {m.group(1) for u in current_urls if (m := PREMIUM_RE.search(u))}
+    ids = set()
+    for entry in m3u.read(src):
+        if isinstance(entry, m3u.Entry) and (m := PREMIUM_RE.search(entry.url)):
+            ids.add(m.group(1))
+            log.debug("found ⇒ %s", entry.url)
     if not ids:
         log.error("No premium{num} identifiers found – aborting.")
         raise SystemExit(1)
 
     log.info("Found %d unique premium IDs: %s", len(ids), sorted(ids))
-    candidates = [tpl.format(num=i) for i in ids for tpl in URL_TEMPLATES]
+    templates = HEALTH.order(URL_TEMPLATES)
+    for tpl in URL_TEMPLATES:
+        if tpl not in templates:
+            log.info("Skipping dead mirror %s", tpl.split("/")[2])
+    candidates = [tpl.format(num=i) for i in ids for tpl in templates]
     log.info("Generated %d candidate URLs to test", len(candidates))
 
-    def check(url):
-        headers = {
-            'User-Agent': 'Mozilla/5.0',
-            'Origin': 'https://jxoplay.xyz',
-            'Referer': 'https://jxoplay.xyz/'
-        }
-        for attempt in range(1, 4):
-            try:
-                log.debug("HEAD %s (try %d)", url, attempt)
-                r = requests.head(url, headers=headers, timeout=10, allow_redirects=True)
-                if r.status_code == 200:
-                    return url
-                if r.status_code == 429:
-                    log.debug("429 – sleeping 5 s before retry")
-                    time.sleep(5)
-                    continue
-                if r.status_code == 404:
-                    return None
-                # fallback to GET for odd responses
-                log.debug("GET %s (try %d)", url, attempt)
-                r = requests.get(url, headers=headers, timeout=10, stream=True, allow_redirects=True)
-                if r.status_code == 200:
-                    return url
-                if r.status_code == 404:
-                    return None
-            except requests.RequestException as e:
-                log.debug("Request error %s: %s", url, e)
-                return None
-        return None
+    if engine == "async" and aiohttp is None:
+        log.warning("aiohttp is not installed – falling back to the thread-pool engine")
+        engine = "threads"
 
-    valid = []
-    with ThreadPoolExecutor(max_workers=workers) as pool:
-        futures = {pool.submit(check, u): u for u in candidates}
-        for fut in as_completed(futures):
-            res = fut.result()
-            if res:
-                valid.append(res)
-                log.info("✓ %s", res)
+    if engine == "async":
+        log.info("Probing with asyncio (concurrency=%d, per host=%d)", concurrency, per_host)
+        valid = asyncio.run(check_all_async(candidates, concurrency, per_host))
+    else:
+        log.info("Probing with %d worker threads", workers)
+        valid = check_all_threads(candidates, workers)
 
+    # fastest first, so every later stage can take the head of the list
+    valid = [url for url, _ in sorted(valid, key=lambda item: speed_key(item[1]))]
     with open(out, "w", encoding="utf-8") as fout:
         fout.write("\n".join(valid))
 
     log.info("Stage 1 complete – %d valid URLs written to %s", len(valid), out)
+    log.info("Mirror health:\n%s", HEALTH.report())
     return valid
 
 # -----------------------------------------------------------------------------
@@ -106,6 +222,7 @@ def validate_links(src=INPUT_PLAYLIST, out=VALID_LINKS_OUT, workers=10):
 # -----------------------------------------------------------------------------
 
 def build_map(valid_links):
+    """Group the validated links by ID, keeping their fastest-first order."""
     log = logging.getLogger("build_map")
     id_to_valids = defaultdict(list)
     for link in valid_links:
@@ -125,39 +242,34 @@ def build_map(valid_links):
 
 def rewrite_streams(src=INPUT_PLAYLIST, id_to_valids=None):
     log = logging.getLogger("rewrite_streams")
-    lines = open(src, encoding="utf-8").read().splitlines()
-    out_lines, replaced = [], 0
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-        if line.startswith("#EXTINF") and i + 1 < len(lines):
-            out_lines.append(line)  # keep EXTINF
-            stream = lines[i + 1].strip()
-            new_stream = stream  # default: keep
-            m = PREMIUM_RE.search(stream)
-            if m:
-                id_ = m.group(1)
+    replaced = 0
+    # src is streamed into a temporary file that replaces it once complete
+    with m3u.Writer(src, header=()) as playlist:
+        for entry in m3u.read(src):
+            if isinstance(entry, m3u.Entry) and (m := PREMIUM_RE.search(entry.url)):
+                stream, id_ = entry.url, m.group(1)
                 if id_ in id_to_valids:
                     valids = id_to_valids[id_]
                     if stream not in valids and valids:  # current invalid, but new valid exists
-                        new_stream = valids[0]  # pick the first valid one
-                        log.debug("Replaced %s → %s", stream, new_stream)
+                        entry = entry._replace(url=valids[0])  # pick the fastest valid one
+                        log.debug("Replaced %s → %s", stream, entry.url)
                         replaced += 1
                     else:
                         log.debug("Kept valid %s", stream)
                 else:
                     log.debug("No valid links for ID %s, kept %s", id_, stream)
-            out_lines.append(new_stream)
-            i += 2
-        else:
-            out_lines.append(line)
-            i += 1
-
-    with open(src, "w", encoding="utf-8") as fout:
-        fout.write("\n".join(out_lines) + "\n")
+            playlist.write(entry)
 
     log.info("Stage 3 complete – %d stream URLs replaced", replaced)
 
+def write_backups(id_to_valids, out=BACKUPS_OUT):
+    """Write {ID → working links, fastest first} so players can fail over."""
+    log = logging.getLogger("rewrite_streams")
+    with open(out, "w", encoding="utf-8") as fout:
+        json.dump({id_: id_to_valids[id_] for id_ in sorted(id_to_valids, key=int)},
+                  fout, indent=2)
+    log.info("Ranked backup links for %d IDs written to %s", len(id_to_valids), out)
+
 # -----------------------------------------------------------------------------
 
 # entry-point
@@ -169,16 +281,43 @@ def main():
         description="Refresh tivimate_playlist.m3u8 with working direct links")
     parser.add_argument("-v", "--verbose", action="store_true",
                         help="show DEBUG-level detail (per-URL checks, replacements)")
+    parser.add_argument("--engine", choices=("async", "threads"), default="async",
+                        help="probe with asyncio/aiohttp (default) or the thread pool")
+    parser.add_argument("--workers", type=int, default=10,
+                        help="worker threads for the thread-pool engine (default: 10)")
+    parser.add_argument("--concurrency", type=int, default=1000,
+                        help="max in-flight probes for the asyncio engine (default: 1000)")
+    parser.add_argument("--per-host", type=int, default=200,
+                        help="max open connections per mirror host for the asyncio engine (default: 200)")
+    parser.add_argument("--positive-ttl", type=float, default=CACHE.positive_ttl,
+                        help="seconds a cached working URL is trusted (default: %(default)s)")
+    parser.add_argument("--negative-ttl", type=float, default=CACHE.negative_ttl,
+                        help="seconds a cached dead URL is trusted (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="probe every URL, ignoring and not updating the result cache")
+    parser.add_argument("--backups", nargs="?", const=BACKUPS_OUT, metavar="FILE",
+                        help="also write ranked backup links per ID as JSON (default file: %(const)s)")
     args = parser.parse_args()
 
     logging.basicConfig(
         level=logging.DEBUG if args.verbose else logging.INFO,
         format="%(levelname)s │ %(name)s │ %(message)s")
 
+    CACHE.positive_ttl = args.positive_ttl
+    CACHE.negative_ttl = args.negative_ttl
+    CACHE.enabled = not args.no_cache
+
     logging.info("▶️ Starting playlist refresh (verbose=%s)", args.verbose)
-    valid = validate_links()
+    try:
+        valid = validate_links(workers=args.workers, engine=args.engine,
+                               concurrency=args.concurrency, per_host=args.per_host)
+    finally:
+        CACHE.close()
+        HEALTH.close()
     id_to_valids = build_map(valid)
     rewrite_streams(id_to_valids=id_to_valids)
+    if args.backups:
+        write_backups(id_to_valids, args.backups)
     logging.info("✅ Done – playlist refreshed")
 
 if __name__ == "__main__":
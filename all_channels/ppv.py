@@ -1,20 +1,44 @@
-import re
 import sys
 import os
 import json
-import base64
-import binascii
 import urllib.parse
 import requests
-import random
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import m3u
+from m3u8_extract import extract_m3u8
+from streamcheck import HostRateLimiter, fetch_manifest, make_session
+
 # API Configuration
 API_ENDPOINT = "https://ppv.to/api/streams"
 TIMEOUT = 20
+OUTPUT_FILE = "ppv.m3u8"
+
+# Embed pages are fetched by SCRAPE_WORKERS threads in parallel, but every
+# host still gets at most one request per HOST_INTERVAL seconds. A 429
+# halves that host's rate and pauses it for Retry-After (or
+# RATE_LIMIT_BACKOFF) seconds; successes bring it back up to the cap.
+SCRAPE_WORKERS = 8
+HOST_INTERVAL = 2.5
+RATE_LIMIT_BACKOFF = 30
+
+# State kept between runs (restored by the workflow's cache step):
+#   resolved.json  stream id → {m3u8, ref_page, source, resolved_at, checked_at}
+#   api.json       the API response of the last successful run
+# A cached m3u8 is reused as long as a liveness probe of it succeeds, so
+# only new, changed or dead streams are scraped again. Streams of a
+# category identical to the last snapshot skip even the probe while their
+# last check is younger than RECHECK_AFTER seconds.
+STATE_DIR = os.getenv("PPV_STATE_DIR", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "ppv"))
+RESOLVED_PATH = os.path.join(STATE_DIR, "resolved.json")
+SNAPSHOT_PATH = os.path.join(STATE_DIR, "api.json")
+RECHECK_AFTER = 3 * 3600
 
 BASE_HEADERS = {
     "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36",
@@ -25,17 +49,41 @@ BASE_HEADERS = {
 SESSION = requests.Session()
 SESSION.headers.update(BASE_HEADERS)
 
-# Configure retry strategy
+# Configure retry strategy. 429 is left to fetch_html so that the shared
+# LIMITER, not urllib3 sleeping in the worker, backs the host off
 retry_strategy = Retry(
     total=3,
     backoff_factor=1,
-    status_forcelist=[429, 500, 502, 503, 504],
+    status_forcelist=[500, 502, 503, 504],
+    respect_retry_after_header=False,  # would retry any 429 carrying Retry-After
     allowed_methods=["HEAD", "GET", "OPTIONS"]
 )
-adapter = HTTPAdapter(max_retries=retry_strategy)
+adapter = HTTPAdapter(max_retries=retry_strategy, pool_maxsize=SCRAPE_WORKERS)
 SESSION.mount("https://", adapter)
 SESSION.mount("http://", adapter)
 
+LIMITER = HostRateLimiter(rate=1 / HOST_INTERVAL, min_rate=1 / (8 * HOST_INTERVAL),
+                          max_rate=1 / HOST_INTERVAL, increase=0.02, backoff=RATE_LIMIT_BACKOFF)
+
+# liveness probes of cached m3u8 URLs (no retries, at most a few KB each)
+PROBE_SESSION = make_session(SCRAPE_WORKERS)
+
+
+def load_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
 
 def fetch_streams_data():
     print(f"Fetching API: {API_ENDPOINT}...")
@@ -49,6 +97,9 @@ def fetch_streams_data():
             print("Falling back to local 'ppv_api.json' file.")
             with open("ppv_api.json", "r", encoding="utf-8") as f:
                 return json.load(f)
+        elif os.path.exists(SNAPSHOT_PATH):
+            print(f"Falling back to the last API snapshot '{SNAPSHOT_PATH}'.")
+            return load_json(SNAPSHOT_PATH, {})
         else:
             raise e
 
@@ -59,39 +110,10 @@ def extract_m3u8_flexible(text):
     1. Plain text URLs
     2. JSON escaped slashes (https:\/\/...)
     3. Base64 encoded strings containing URLs
-    """
-    if not text:
-        return None
-
-    # 1. Clean JSON escaped slashes
-    clean_text = text.replace(r"\/", "/")
-
-    # Regex for standard http(s) .m3u8
-    # We allow query parameters e.g. .m3u8?token=...
-    url_pattern = r'(https?://[^\s"\'<>]+?\.m3u8(?:[\?&][^\s"\'<>]*)?)'
-
-    # Try finding in plain text first
-    match = re.search(url_pattern, clean_text)
-    if match:
-        return match.group(1)
 
-    # 2. Try finding Base64 encoded URLs
-    # Look for long strings that might be base64
-    base64_candidates = re.findall(r'"([a-zA-Z0-9+/=]{20,})"', clean_text)
-
-    for candidate in base64_candidates:
-        try:
-            decoded_bytes = base64.b64decode(candidate)
-            decoded_str = decoded_bytes.decode('utf-8', errors='ignore')
-            # Check if the decoded string contains an m3u8 link
-            if ".m3u8" in decoded_str:
-                b64_match = re.search(url_pattern, decoded_str)
-                if b64_match:
-                    return b64_match.group(1)
-        except (binascii.Error, UnicodeDecodeError):
-            continue
-
-    return None
+    See m3u8_extract.extract_m3u8, which does all three in a single pass.
+    """
+    return extract_m3u8(text)
 
 
 def origin_of(url):
@@ -112,19 +134,21 @@ def fetch_html(url, referer=None):
         headers["Sec-Fetch-Site"] = "cross-site"
 
     try:
-        # Add a randomized delay to be polite and avoid rate limits
-        delay = random.uniform(2.5, 5.0)
-        time.sleep(delay) 
-        
+        # Wait for this host's turn to be polite and avoid rate limits
+        delay = LIMITER.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
         print(f"Fetching {url} (wait: {delay:.2f}s)...")
         resp = SESSION.get(url, headers=headers, timeout=TIMEOUT)
         print(f"Status: {resp.status_code}, Length: {len(resp.text)}")
         
         if resp.status_code == 200:
+            LIMITER.success(url)
             return resp.text
         elif resp.status_code == 429:
-            print(f"Rate limited (429) on {url}, waiting 30s before continuing...")
-            time.sleep(30)
+            print(f"Rate limited (429) on {url}, backing off this host...")
+            LIMITER.throttled(url, resp.headers.get("Retry-After"))
             return ""
         elif resp.status_code == 403:
             # Just log and continue to next stream - don't stop the script
@@ -166,53 +190,110 @@ def get_m3u8_for_stream(stream):
     return None, None
 
 
-def generate_m3u_playlist(streams_data):
-    out = ["#EXTM3U"]
+def stream_key(stream):
+    return str(stream.get("id") or stream.get("uri_name") or stream.get("iframe"))
+
 
+def stream_source(stream):
+    """The fields a resolution depends on; a cached entry is only valid for the same ones."""
+    return [stream.get("iframe"), stream.get("uri_name")]
+
+
+def is_alive(m3u8_url, ref_page):
+    headers = {
+        "User-Agent": BASE_HEADERS["User-Agent"],
+        "Referer": ref_page,
+        "Origin": origin_of(ref_page),
+    }
+    try:
+        return fetch_manifest(m3u8_url, PROBE_SESSION, headers, timeout=TIMEOUT).status == 200
+    except requests.RequestException:
+        return False
+
+
+def resolve_stream(stream, cached, trusted):
+    """Return (state entry or None, how) for one stream, reusing the cached
+    entry when it still works. how is "reused", "alive" or "scraped"."""
+    now = time.time()
+    if cached and cached.get("source") == stream_source(stream):
+        if trusted and now - cached.get("checked_at", 0) < RECHECK_AFTER:
+            return cached, "reused"
+        if is_alive(cached["m3u8"], cached["ref_page"]):
+            return {**cached, "checked_at": now}, "alive"
+
+    m3u8_url, ref_page = get_m3u8_for_stream(stream)
+    if not m3u8_url:
+        return None, "scraped"
+    return {
+        "m3u8": m3u8_url,
+        "ref_page": ref_page,
+        "source": stream_source(stream),
+        "resolved_at": now,
+        "checked_at": now,
+    }, "scraped"
+
+
+def generate_m3u_playlist(streams_data, path=OUTPUT_FILE, previous=None):
+    """Resolve every stream and write the playlist to path as entries are
+    found. previous is the API data of the last run, used to spot
+    unchanged categories. Returns the number of streams written, or None if
+    the API data had no streams and nothing was written."""
     # Handle case where API returns empty or malformed data
     categories = streams_data.get("streams", [])
     if not categories:
         print("Warning: No 'streams' key found in API response.")
-        return ""
+        return None
 
-    total_found = 0
+    before = {c.get("category"): json.dumps(c, sort_keys=True)
+              for c in (previous or {}).get("streams", [])}
+    state = load_json(RESOLVED_PATH, {})
+    new_state = {}
+    counts = {"reused": 0, "alive": 0, "scraped": 0}
 
+    jobs = []
     for category in categories:
         group = category.get("category", "Unknown")
         matches = category.get("streams", [])
-        print(f"Processing Category: {group} ({len(matches)} streams)")
-
-        for s in matches:
+        unchanged = before.get(category.get("category")) == json.dumps(category, sort_keys=True)
+        print(f"Processing Category: {group} ({len(matches)} streams{', unchanged' if unchanged else ''})")
+        jobs.extend((group, s, unchanged) for s in matches)
+
+    # Streams are resolved concurrently (LIMITER keeps each host polite);
+    # map() hands the results back in catalogue order.
+    with ThreadPoolExecutor(max_workers=SCRAPE_WORKERS) as pool, m3u.Writer(path) as playlist:
+        resolved = pool.map(lambda job: resolve_stream(job[1], state.get(stream_key(job[1])), job[2]), jobs)
+        for (group, s, _), (entry, how) in zip(jobs, resolved):
             name = s.get("name") or "Untitled"
             poster = s.get("poster") or ""
+            counts[how] += 1
 
-            m3u8_url, ref_page = get_m3u8_for_stream(s)
-
-            if not m3u8_url:
+            if not entry:
                 # Skip if we couldn't find a link
                 continue
 
-            total_found += 1
-            ref_used = ref_page or "https://ppv.to/"
+            new_state[stream_key(s)] = entry
+            m3u8_url = entry["m3u8"]
+            ref_used = entry["ref_page"] or "https://ppv.to/"
 
-            out.append(f'#EXTINF:-1 tvg-logo="{poster}" group-title="{group.upper()}",{name}')
-            out.append(f"#EXTVLCOPT:http-origin={origin_of(ref_used)}")
-            out.append(f"#EXTVLCOPT:http-referrer={ref_used}")
-            out.append(f"#EXTVLCOPT:http-user-agent={BASE_HEADERS['User-Agent']}")
-            out.append(m3u8_url)
+            playlist.write(m3u.Entry.build(
+                name, m3u8_url,
+                {"tvg-logo": poster, "group-title": group.upper()},
+                m3u.vlc_options(origin_of(ref_used), ref_used, BASE_HEADERS['User-Agent']),
+            ))
 
-    print(f"\nTotal streams extracted: {total_found}")
-    return "\n".join(out) + "\n"
+    save_json(RESOLVED_PATH, new_state)
+    print(f"\nTotal streams extracted: {playlist.count} "
+          f"(reused {counts['reused']}, still alive {counts['alive']}, scraped {counts['scraped']})")
+    return playlist.count
 
 
 def main():
     try:
+        previous = load_json(SNAPSHOT_PATH, None)
         data = fetch_streams_data()
-        playlist = generate_m3u_playlist(data)
-        if playlist:
-            with open("ppv.m3u8", "w", encoding="utf-8") as f:
-                f.write(playlist)
-            print("Success: M3U playlist generated: ppv.m3u8")
+        if generate_m3u_playlist(data, previous=previous) is not None:
+            save_json(SNAPSHOT_PATH, data)
+            print(f"Success: M3U playlist generated: {OUTPUT_FILE}")
         else:
             print("Failed: No streams were extracted.")
     except Exception as e:
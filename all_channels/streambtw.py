@@ -1,23 +1,50 @@
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+import os
 import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import m3u
+from m3u8_extract import extract_m3u8
+from streamcheck import make_session
 
 # Base URL and headers
 BASE_URL = "https://streambtw.com/"
+OUTPUT_FILE = "streambtw.m3u8"
+STREAM_UA = 'Mozilla/5.0 (Windows NT 11.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.6998.166 Safari/537.36'
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
     'Referer': 'https://streambtw.com'
 }
+TIMEOUT = 10
+WORKERS = 16  # iframe pages fetched at once
+
+# one keep-alive connection pool shared by the homepage and every iframe fetch
+SESSION = make_session(WORKERS)
+SESSION.headers.update(HEADERS)
+
+# BeautifulSoup backend for the homepage: "lxml" when it is installed (about
+# 1.5x faster on the card-only parse), else the built-in "html.parser"
+try:
+    import lxml  # noqa: F401
+    DEFAULT_PARSER = "lxml"
+except ImportError:
+    DEFAULT_PARSER = "html.parser"
+PARSER = os.getenv("STREAMBTW_PARSER", DEFAULT_PARSER)
+# only the event cards are built into a tree, the rest of the page is
+# skipped; the class is matched as a word as it may arrive unsplit ("card mb-3")
+CARDS = SoupStrainer('div', class_=re.compile(r'(?:^|\s)card(?:\s|$)'))
 
 def fetch_homepage():
     """Fetch the homepage HTML content."""
-    response = requests.get(BASE_URL, headers=HEADERS)
+    response = SESSION.get(BASE_URL, timeout=TIMEOUT)
     response.raise_for_status()
     return response.text
 
-def parse_events(html_content):
+def parse_events(html_content, parser=None):
     """Parse events from the homepage HTML."""
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = BeautifulSoup(html_content, parser or PARSER, parse_only=CARDS)
     events = []
 
     # Find all card elements
@@ -69,32 +96,19 @@ def parse_events(html_content):
 def extract_m3u8_from_iframe(iframe_url):
     """Extract the m3u8 URL from the iframe page."""
     try:
-        response = requests.get(iframe_url, headers=HEADERS, timeout=10)
+        response = SESSION.get(iframe_url, timeout=TIMEOUT)
         if response.status_code == 200:
-            html_content = response.text
-
-            # Search for m3u8 URL in the page source
-            m3u8_match = re.search(r'https?://[^\s"\']+\.m3u8[^\s"\'>]*', html_content)
-            if m3u8_match:
-                return m3u8_match.group(0)
-
-            # Alternative pattern for playlist URLs
-            m3u8_match = re.search(r'["\']([^"\'\s]+\.m3u8[^"\'\s]*)["\']', html_content)
-            if m3u8_match:
-                url = m3u8_match.group(1)
-                if not url.startswith('http'):
-                    # Try to construct full URL if relative
-                    return url
-                return url
+            # Absolute URLs first, then base64-hidden ones, then quoted relative paths
+            return extract_m3u8(response.text, relative=True, tail=True)
 
     except Exception as e:
         print(f"Error fetching iframe {iframe_url}: {e}")
 
     return None
 
-def generate_m3u_playlist(events):
-    """Generate M3U playlist content from parsed events."""
-    m3u_content = "#EXTM3U\n"
+def generate_m3u_playlist(events, path=OUTPUT_FILE):
+    """Write the M3U playlist for the parsed events to path, streaming each
+    entry as soon as its m3u8 URL is found. Returns the number of entries."""
 
     # Group events by category
     categories = {}
@@ -104,24 +118,30 @@ def generate_m3u_playlist(events):
             categories[category] = []
         categories[category].append(event)
 
-    # Process each category
-    for category, category_events in categories.items():
-        print(f"\nProcessing category: {category}")
-        for event in category_events:
+    # Resolve every iframe on the worker pool; map() yields the results in
+    # submission order, so the playlist keeps the category grouping
+    ordered = [(category, event) for category, category_events in categories.items()
+               for event in category_events]
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool, m3u.Writer(path) as playlist:
+        resolved = pool.map(extract_m3u8_from_iframe, (event['iframe_url'] for _, event in ordered))
+        current = None
+        for (category, event), m3u8_url in zip(ordered, resolved):
+            if category != current:
+                current = category
+                print(f"\nProcessing category: {category}")
             print(f"  - {event['name']}")
-            m3u8_url = extract_m3u8_from_iframe(event['iframe_url'])
 
             if m3u8_url:
                 print(f"    Found m3u8: {m3u8_url[:80]}...")
-                m3u_content += f'#EXTINF:-1 tvg-logo="{event["logo"]}" group-title="{category.upper()}",{event["name"]}\n'
-                m3u_content += '#EXTVLCOPT:http-origin=https://streambtw.com\n'
-                m3u_content += '#EXTVLCOPT:http-referrer=https://streambtw.com/\n'
-                m3u_content += '#EXTVLCOPT:http-user-agent=Mozilla/5.0 (Windows NT 11.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.6998.166 Safari/537.36\n'
-                m3u_content += f'{m3u8_url}\n'
+                playlist.write(m3u.Entry.build(
+                    event["name"], m3u8_url,
+                    {"tvg-logo": event["logo"], "group-title": category.upper()},
+                    m3u.vlc_options("https://streambtw.com", "https://streambtw.com/", STREAM_UA),
+                ))
             else:
                 print(f"    No m3u8 found")
 
-    return m3u_content
+    return playlist.count
 
 # Main execution
 if __name__ == "__main__":
@@ -134,12 +154,9 @@ if __name__ == "__main__":
         print(f"Found {len(events)} events")
 
         print("\nExtracting m3u8 URLs...")
-        playlist = generate_m3u_playlist(events)
-
-        with open("streambtw.m3u8", "w", encoding="utf-8") as f:
-            f.write(playlist)
+        count = generate_m3u_playlist(events)
 
-        print("\nM3U playlist generated: streambtw.m3u8")
+        print(f"\nM3U playlist generated: {OUTPUT_FILE} ({count} streams)")
 
     except Exception as e:
         print(f"Error: {e}")
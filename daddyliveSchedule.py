@@ -3,9 +3,9 @@ import random
 import uuid
 import fetcher
 import json
-import os
 import datetime
 import pytz
+import m3u
 
 #generate static list of static channel names
 #get schedule JSON
@@ -18,6 +18,7 @@ DADDY_JSON_FILE     = "daddyliveSchedule.json"
 M3U8_OUTPUT_FILE    = "daily.m3u8"
 EPG_OUTPUT_FILE     = "daily.xml"
 LOGO                = "https://raw.githubusercontent.com/JHarding86/daddylive-m3u/refs/heads/main/hardingtv.png"
+STREAM_URL          = "https://xyzdddd.mizhls.ru/lb/premium{}/index.m3u8"
 
 mStartTime = 0
 mStopTime = 0
@@ -30,6 +31,11 @@ def generate_unique_ids(count, seed=42):
         ids.append(id_str)
     return ids
 
+def channelEntry(UniqueID, tvgName, tvLabel, channelID):
+    attrs = {"tvg-id": UniqueID, "tvg-name": tvgName, "tvg-logo": LOGO, "group-title": "USA (DADDY LIVE)"}
+    # daily.m3u8 has always had a space before the title
+    return m3u.Entry.build(f" {tvLabel}", STREAM_URL.format(channelID), attrs)
+
 def loadJSON(filepath):
     # Open and read the JSON file
     with open(filepath, 'r', encoding='utf-8') as file:
@@ -74,7 +80,7 @@ def createSingleEPGData(startTime, stopTime, UniqueID, channelName, description)
 
     return programme
 
-def addChannelsByLeagueSport(leagueSportTuple):
+def addChannelsByLeagueSport(leagueSportTuple, playlist):
     for day, value in dadjson.items():
         try:
             # print("NEW DAY\n\n\n")
@@ -120,10 +126,8 @@ def addChannelsByLeagueSport(leagueSportTuple):
                             # tvgName = channelName
                             # tvLabel = channel["channel_name"]
 
-                            with open(M3U8_OUTPUT_FILE, 'a', encoding='utf-8') as file:  # Use 'a' mode for appending
-                                file.write(f'#EXTINF:-1 tvg-id="{UniqueID}" tvg-name="{tvgName}" tvg-logo="{LOGO}" group-title="USA (DADDY LIVE)", {tvLabel}\n')
-                                file.write(f"https://xyzdddd.mizhls.ru/lb/premium{channelID}/index.m3u8\n")
-                                file.write('\n')
+                            playlist.write(channelEntry(UniqueID, tvgName, tvLabel, channelID))
+                            playlist.write("")
 
                             #Creating M3U8 Data
                             xmlChannel = createSingleChannelEPGData(UniqueID, tvgName)
@@ -141,9 +145,6 @@ fetcher.fetchHTML(DADDY_JSON_FILE, "https://thedaddy.to/schedule/schedule-genera
 
 dadjson = loadJSON(DADDY_JSON_FILE)
 
-if os.path.isfile(M3U8_OUTPUT_FILE):
-    os.remove(M3U8_OUTPUT_FILE)
-
 root = ET.Element('tv')
 
 #league sport tuple
@@ -151,23 +152,23 @@ leageSportTuple = []
 leageSportTuple.append({"league":"NHL", "sport":"Ice Hockey"})
 leageSportTuple.append({"league":"NFL", "sport":"Am. Football"})
 
-addChannelsByLeagueSport(leageSportTuple)
+# The playlist replaces M3U8_OUTPUT_FILE only once it is complete
+with m3u.Writer(M3U8_OUTPUT_FILE, header=()) as playlist:
+    addChannelsByLeagueSport(leageSportTuple, playlist)
 
-#Fill out the remaining channels so that you don't have to re-add the channels list into plex
-for id in unique_ids:
-    with open(M3U8_OUTPUT_FILE, 'a', encoding='utf-8') as file:  # Use 'a' mode for appending
+    #Fill out the remaining channels so that you don't have to re-add the channels list into plex
+    for id in unique_ids:
         channelNumber = str(channelCount).zfill(3)
         tvgName = "OpenChannel" + channelNumber
-        file.write(f'#EXTINF:-1 tvg-id="{id}" tvg-name="{tvgName}" tvg-logo="{LOGO}" group-title="USA (DADDY LIVE)", {tvgName}\n')
-        file.write(f"https://xyzdddd.mizhls.ru/lb/premium{channelNumber}/index.m3u8\n")
-        file.write('\n')
+        playlist.write(channelEntry(id, tvgName, tvgName, channelNumber))
+        playlist.write("")
         channelCount += 1
 
-    xmlChannel = createSingleChannelEPGData(id, tvgName)
-    root.append(xmlChannel)
+        xmlChannel = createSingleChannelEPGData(id, tvgName)
+        root.append(xmlChannel)
 
-    programme = createSingleEPGData(mStartTime, mStopTime, id, "No Programm Available", "No Description")
-    root.append(programme)
+        programme = createSingleEPGData(mStartTime, mStopTime, id, "No Programm Available", "No Description")
+        root.append(programme)
 
 tree = ET.ElementTree(root)
 tree.write(EPG_OUTPUT_FILE, encoding='utf-8', xml_declaration=True)
\ No newline at end of file
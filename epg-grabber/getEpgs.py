@@ -1,115 +1,470 @@
-import os
-import gzip
-import xml.etree.ElementTree as ET
-import requests
-
-save_as_gz = True  # Set to True to save an additional .gz version
-
-tvg_ids_file = os.path.join(os.path.dirname(__file__), 'tvg-ids.txt')
-output_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'epg.xml')
-output_file_gz = output_file + '.gz'
-
-def fetch_and_extract_xml(url):
-    response = requests.get(url)
-    if response.status_code != 200:
-        print(f"Failed to fetch {url}")
-        return None
-
-    if url.endswith('.gz'):
-        try:
-            decompressed_data = gzip.decompress(response.content)
-            return ET.fromstring(decompressed_data)
-        except Exception as e:
-            print(f"Failed to decompress and parse XML from {url}: {e}")
-            return None
-    else:
-        try:
-            return ET.fromstring(response.content)
-        except Exception as e:
-            print(f"Failed to parse XML from {url}: {e}")
-            return None
-
-def filter_and_build_epg(urls):
-    with open(tvg_ids_file, 'r') as file:
-        valid_tvg_ids = set(line.strip() for line in file)
-
-    root = ET.Element('tv')
-
-    for url in urls:
-        epg_data = fetch_and_extract_xml(url)
-        if epg_data is None:
-            continue
-
-        for channel in epg_data.findall('channel'):
-            tvg_id = channel.get('id')
-            if tvg_id in valid_tvg_ids:
-                root.append(channel)
-
-        for programme in epg_data.findall('programme'):
-            tvg_id = programme.get('channel')
-            if tvg_id in valid_tvg_ids:
-                title = programme.find('title')
-                if title is not None:
-                    title_text = title.text if title is not None else 'No title'
-
-                    if title_text == 'NHL Hockey' or title_text == 'Live: NFL Football':
-                        subtitle = programme.find('sub-title')
-                        subtitle_text = subtitle.text if subtitle else 'No subtitle'
-                        programme.find('title').text = title_text + " " + subtitle_text
-
-                    root.append(programme)
-
-    tree = ET.ElementTree(root)
-    tree.write(output_file, encoding='utf-8', xml_declaration=True)
-    print(f"New EPG saved to {output_file}")
-
-    if save_as_gz:
-        with gzip.open(output_file_gz, 'wb') as f:
-            tree.write(f, encoding='utf-8', xml_declaration=True)
-        print(f"New EPG saved to {output_file_gz}")
-
-m3u4u_epg = os.getenv("M3U4U_EPG")
-
-urls = [
-  'https://www.dropbox.com/scl/fi/7r7h1jdufwoplnhhxkism/m3u4u-103216-593044-EPG.xml?rlkey=606vswc00na76l51otnz116ed&st=q273qocn&dl=1',
-  'https://www.dropbox.com/scl/fi/tsj8796ea6krin4pv4t32/m3u4u-103216-595541-EPG.xml?rlkey=tu42144366j5w0n2s8fc1ogvp&st=2gg7ylx2&dl=1',
-  'https://epgshare01.online/epgshare01/epg_ripper_US1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_US_LOCALS2.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_CA1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_UK1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_AU1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_IE1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_DE1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_ZA1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_FR1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_CL1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_BR1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_BG1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_DK1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_GR1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_IL1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_IT1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_MY1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_MX1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_NL1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_NZ1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_CZ1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_SG1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_PK1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_RO1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_CH1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_PL1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_SE1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_UY1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_CO1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_PT1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_ES1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_TR1.xml.gz',
-  'https://epgshare01.online/epgshare01/epg_ripper_FANDUEL1.xml.gz',
-  'https://epg.pw/api/epg.xml?channel_id=8486',
-  'https://epg.pw/api/epg.xml?channel_id=12358',
-  'https://epg.pw/api/epg.xml?channel_id=9206',
-]
-
-if __name__ == "__main__":
-    filter_and_build_epg(urls)
+import hashlib
+import os
+import pickle
+import sys
+import struct
+import time
+import zlib
+import xml.etree.ElementTree as ET
+from bisect import bisect_left
+from collections import defaultdict, deque
+from itertools import accumulate
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from httpcache import HTTPCache, iter_body
+
+save_as_gz = True  # Set to True to save an additional .gz version
+download_workers = 6  # Sources downloaded in parallel ahead of the parser
+download_timeout = 120
+compress_workers = os.cpu_count() or 1  # Threads used to deflate epg.xml.gz
+past_window_hours = 6  # Drop programmes that ended longer ago than this (None keeps them all)
+future_window_days = 3  # Drop programmes starting later than this from now (None keeps them all)
+
+# When several sources carry the same channel the one listed first here wins;
+# entries are matched as substrings of the source url. Sources not listed
+# keep their order in urls, after all listed ones.
+source_priority = []
+
+tvg_ids_file = os.path.join(os.path.dirname(__file__), 'tvg-ids.txt')
+output_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'epg.xml')
+output_file_gz = output_file + '.gz'
+records_cache_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'epg-records')
+records_format = 1  # Bump when iter_records changes what it produces
+
+cache = HTTPCache()
+
+def make_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=download_workers, pool_maxsize=download_workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def fetch_and_extract_xml(url, session=requests):
+    try:
+        # Unchanged sources are answered with 304 and read from the cache
+        body_path = cache.fetch(url, session=session, timeout=download_timeout)
+    except requests.RequestException as e:
+        print(f"Failed to fetch {url}: {e}")
+        return None
+    if body_path is None:
+        print(f"Failed to fetch {url}")
+        return None
+
+    # Decoded lazily, chunk by chunk, by whoever consumes the source
+    return iter_body(body_path, gzipped=url.endswith('.gz')), cache.content_hash(url)
+
+def iter_parse_events(chunks):
+    """Feed an iterable of XML byte chunks to a pull parser and yield its
+    (event, element) pairs as they become available."""
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+def days_from_civil(year, month, day):
+    """Days since 1970-01-01 of a proleptic Gregorian date (H. Hinnant's
+    algorithm), so no datetime object is needed per programme."""
+    year -= month <= 2
+    era = (year if year >= 0 else year - 399) // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+def parse_xmltv_time(value):
+    """Convert an XMLTV timestamp such as '20250209013000 +0100' to a Unix
+    timestamp. Returns None when the value cannot be parsed."""
+    if not value:
+        return None
+    stamp, _, zone = value.strip().partition(' ')
+    if len(stamp) > 14:
+        stamp, zone = stamp[:14], stamp[14:]
+    try:
+        seconds = (days_from_civil(int(stamp[0:4]), int(stamp[4:6]), int(stamp[6:8])) * 86400
+                   + int(stamp[8:10] or 0) * 3600 + int(stamp[10:12] or 0) * 60 + int(stamp[12:14] or 0))
+        if len(zone) >= 5 and zone[0] in '+-':
+            offset = int(zone[1:3]) * 3600 + int(zone[3:5]) * 60
+            seconds -= offset if zone[0] == '+' else -offset
+    except ValueError:
+        return None
+    return seconds
+
+def programme_window():
+    """Return the (earliest stop, latest start) Unix timestamps a programme
+    must fall within to be kept; either bound may be None."""
+    now = time.time()
+    earliest = now - past_window_hours * 3600 if past_window_hours is not None else None
+    latest = now + future_window_days * 86400 if future_window_days is not None else None
+    return earliest, latest
+
+def in_window(start, stop, window):
+    earliest, latest = window
+    if start is None:
+        return True
+    if latest is not None and start > latest:
+        return False
+    if earliest is not None and (stop if stop is not None else start) <= earliest:
+        return False
+    return True
+
+def iter_matching_elements(chunks, valid_tvg_ids):
+    """Incrementally parse an XMLTV document and yield the top-level
+    <channel>/<programme> elements whose id is in valid_tvg_ids.
+
+    Every top-level element is dropped from the tree as soon as it has been
+    looked at, so memory stays flat regardless of the size of the source.
+    """
+    context = iter_parse_events(chunks)
+    first = next(context, None)
+    if first is None:
+        return
+    root = first[1]
+    depth = 0
+
+    for event, elem in context:
+        if event == 'start':
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth != 0:
+            continue
+
+        if elem.tag == 'channel':
+            if elem.get('id') in valid_tvg_ids:
+                yield elem
+        elif elem.tag == 'programme':
+            if elem.get('channel') in valid_tvg_ids:
+                title = elem.find('title')
+                if title is not None:
+                    title_text = title.text if title is not None else 'No title'
+
+                    if title_text == 'NHL Hockey' or title_text == 'Live: NFL Football':
+                        subtitle = elem.find('sub-title')
+                        subtitle_text = subtitle.text if subtitle else 'No subtitle'
+                        title.text = title_text + " " + subtitle_text
+
+                    yield elem
+
+        root.clear()
+
+def iter_records(chunks, valid_tvg_ids):
+    """Yield a (channel id, raw start, start, stop, serialized element) record
+    for every matching element of a source. Raw start, start and stop are
+    None for <channel> elements; start and stop are Unix timestamps."""
+    for elem in iter_matching_elements(chunks, valid_tvg_ids):
+        # the tail may not be parsed yet when the element ends
+        elem.tail = '\n'
+        data = ET.tostring(elem, encoding='utf-8', xml_declaration=False)
+        if elem.tag == 'channel':
+            yield elem.get('id'), None, None, None, data
+        else:
+            start_raw = elem.get('start')
+            yield (elem.get('channel'), start_raw, parse_xmltv_time(start_raw),
+                   parse_xmltv_time(elem.get('stop')), data)
+
+class EPGMerger:
+    """Merge the records of several sources, highest priority source first.
+
+    A channel is kept from the first source that lists it. A programme is
+    dropped when its (channel, start) pair was already merged, or when it
+    overlaps a programme that an earlier source already supplied for the
+    same channel. Every check is a set lookup or a bisect, so merging runs
+    in (near) linear time. Only the filtered output is held in memory.
+    """
+
+    def __init__(self):
+        self.channels = {}  # channel id -> serialized <channel>
+        self.programme_keys = set()  # (channel id, raw start) already merged
+        self.merged = defaultdict(list)  # channel id -> [(start, stop, data)] sorted by start
+        self.max_stops = {}  # channel id -> latest stop among merged[channel id][:i + 1]
+        self.current = defaultdict(list)  # programmes accepted from the source being merged
+        self.duplicates = 0
+        self.overlaps = 0
+
+    def add(self, channel_id, start_raw, start, stop, data):
+        if start_raw is None:
+            if channel_id in self.channels:
+                self.duplicates += 1
+            else:
+                self.channels[channel_id] = data
+            return
+
+        key = (channel_id, start_raw)
+        if key in self.programme_keys:
+            self.duplicates += 1
+            return
+
+        if start is None:
+            start = stop = 0
+        elif stop is None or stop < start:
+            stop = start
+        if self._overlaps(channel_id, start, stop):
+            self.overlaps += 1
+            return
+
+        self.programme_keys.add(key)
+        self.current[channel_id].append((start, stop, data))
+
+    def _overlaps(self, channel_id, start, stop):
+        previous = self.merged.get(channel_id)
+        if not previous:
+            return False
+        # every programme starting before this one ends is a candidate; a
+        # source may overlap itself, so the one starting last is not enough
+        # and the latest stop among all of them decides
+        i = bisect_left(previous, max(stop, start + 1), key=itemgetter(0))
+        return i > 0 and self.max_stops[channel_id][i - 1] > start
+
+    def end_source(self):
+        for channel_id, programmes in self.current.items():
+            merged = self.merged[channel_id]
+            merged.extend(programmes)
+            # two sorted runs, which Timsort merges in linear time
+            merged.sort(key=itemgetter(0))
+            self.max_stops[channel_id] = list(accumulate((stop for _, stop, _ in merged), max))
+        self.current.clear()
+
+    def write(self, out):
+        for data in self.channels.values():
+            out.write(data)
+        for programmes in self.merged.values():
+            for _, _, data in programmes:
+                out.write(data)
+
+def records_path(key):
+    return os.path.join(records_cache_dir, key + '.pickle.z')
+
+def load_records(key):
+    """Return the cached records of a source, or None on a cache miss."""
+    try:
+        with open(records_path(key), 'rb') as file:
+            return pickle.loads(zlib.decompress(file.read()))
+    except (OSError, ValueError, zlib.error, pickle.UnpicklingError, EOFError):
+        return None
+
+def save_records(key, records):
+    os.makedirs(records_cache_dir, exist_ok=True)
+    tmp_path = records_path(key) + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(zlib.compress(pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL), 1))
+    os.replace(tmp_path, records_path(key))
+
+def prune_records(keep):
+    """Remove cached records that were not used by this run."""
+    if not os.path.isdir(records_cache_dir):
+        return
+    for name in os.listdir(records_cache_dir):
+        if name.endswith('.pickle.z') and name[:-len('.pickle.z')] not in keep:
+            os.remove(os.path.join(records_cache_dir, name))
+
+def order_by_priority(urls):
+    def rank(url):
+        return next((i for i, pattern in enumerate(source_priority) if pattern in url), len(source_priority))
+    return sorted(urls, key=rank)
+
+def iter_sources(urls, session):
+    """Yield (url, source) pairs in the order of urls while up to
+    download_workers downloads run ahead of the consumer.
+
+    Only a bounded window of sources is ever in flight or waiting to be
+    parsed, so memory does not grow with the number of urls.
+    """
+    remaining = iter(urls)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=download_workers) as pool:
+        def submit_next():
+            url = next(remaining, None)
+            if url is not None:
+                pending.append((url, pool.submit(fetch_and_extract_xml, url, session)))
+
+        for _ in range(download_workers):
+            submit_next()
+
+        while pending:
+            url, future = pending.popleft()
+            submit_next()
+            yield url, future.result()
+
+def deflate_block(block, dictionary, last, level):
+    """Raw-deflate one block, primed with the tail of the previous block so
+    the ratio stays close to a single-stream compressor."""
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+class ParallelGzipWriter:
+    """Write a single-member .gz file whose blocks are deflated on a thread
+    pool (the same scheme pigz uses). zlib releases the GIL while
+    compressing, so the blocks really are compressed in parallel."""
+
+    block_size = 128 * 1024
+
+    def __init__(self, path, workers=compress_workers, level=9):
+        self.level = level
+        self.workers = workers
+        self.file = open(path, 'wb')
+        self.file.write(b'\x1f\x8b\x08\x00' + struct.pack('<I', int(time.time())) + b'\x02\xff')
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.dictionary = b''
+        self.crc = 0
+        self.size = 0
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            block = bytes(self.buffer[:self.block_size])
+            del self.buffer[:self.block_size]
+            self._submit(block, last=False)
+
+    def _submit(self, block, last):
+        self.crc = zlib.crc32(block, self.crc)
+        self.size += len(block)
+        self.pending.append(self.pool.submit(deflate_block, block, self.dictionary, last, self.level))
+        self.dictionary = block[-32 * 1024:]
+        # keep a bounded number of compressed blocks waiting to be written
+        while len(self.pending) > 2 * self.workers:
+            self.file.write(self.pending.popleft().result())
+
+    def close(self):
+        self._submit(bytes(self.buffer), last=True)
+        self.buffer.clear()
+        while self.pending:
+            self.file.write(self.pending.popleft().result())
+        self.file.write(struct.pack('<II', self.crc & 0xffffffff, self.size & 0xffffffff))
+        self.file.close()
+        self.pool.shutdown()
+
+class EPGWriter:
+    """Serialize the EPG once and fan the bytes out to epg.xml and, when
+    save_as_gz is set, to epg.xml.gz at the same time."""
+
+    def __init__(self, path, gz_path=None):
+        self.outputs = [open(path, 'wb')]
+        if gz_path:
+            self.outputs.append(ParallelGzipWriter(gz_path))
+
+    def write(self, data):
+        for output in self.outputs:
+            output.write(data)
+
+    def close(self):
+        for output in self.outputs:
+            output.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def filter_and_build_epg(urls):
+    with open(tvg_ids_file, 'r') as file:
+        valid_tvg_ids = set(line.strip() for line in file)
+
+    # Filtered records are cached per source, keyed by the hash of the
+    # downloaded body and of tvg-ids.txt, so unchanged sources skip parsing.
+    with open(tvg_ids_file, 'rb') as file:
+        ids_hash = hashlib.sha256(file.read()).hexdigest()[:16]
+
+    window = programme_window()
+    merger = EPGMerger()
+    used_keys = set()
+    cached = 0
+    with make_session() as session:
+        for url, source in iter_sources(order_by_priority(urls), session):
+            if source is None:
+                continue
+
+            chunks, content_hash = source
+            key = f"{content_hash}-{ids_hash}-{records_format}" if content_hash else None
+            records = load_records(key) if key else None
+            if records is not None:
+                cached += 1
+            else:
+                try:
+                    records = list(iter_records(chunks, valid_tvg_ids))
+                except (ET.ParseError, zlib.error) as e:
+                    print(f"Failed to parse XML from {url}: {e}")
+                    continue
+                if key:
+                    save_records(key, records)
+            if key:
+                used_keys.add(key)
+
+            for record in records:
+                if in_window(record[2], record[3], window):
+                    merger.add(*record)
+            merger.end_source()
+
+    prune_records(used_keys)
+    print(f"{cached} source(s) merged from the records cache")
+    print(f"Merged {len(merger.channels)} channels and {len(merger.programme_keys)} programmes, "
+          f"dropped {merger.duplicates} duplicates and {merger.overlaps} overlapping programmes")
+
+    gz_file = output_file_gz if save_as_gz else None
+    with EPGWriter(output_file, gz_file) as out:
+        out.write(b"<?xml version='1.0' encoding='utf-8'?>\n<tv>")
+        merger.write(out)
+        out.write(b"</tv>")
+    print(f"New EPG saved to {output_file}")
+    if save_as_gz:
+        print(f"New EPG saved to {output_file_gz}")
+
+m3u4u_epg = os.getenv("M3U4U_EPG")
+
+urls = [
+  'https://www.dropbox.com/scl/fi/7r7h1jdufwoplnhhxkism/m3u4u-103216-593044-EPG.xml?rlkey=606vswc00na76l51otnz116ed&st=q273qocn&dl=1',
+  'https://www.dropbox.com/scl/fi/tsj8796ea6krin4pv4t32/m3u4u-103216-595541-EPG.xml?rlkey=tu42144366j5w0n2s8fc1ogvp&st=2gg7ylx2&dl=1',
+  'https://epgshare01.online/epgshare01/epg_ripper_US1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_US_LOCALS2.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_CA1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_UK1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_AU1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_IE1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_DE1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_ZA1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_FR1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_CL1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_BR1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_BG1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_DK1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_GR1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_IL1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_IT1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_MY1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_MX1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_NL1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_NZ1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_CZ1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_SG1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_PK1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_RO1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_CH1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_PL1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_SE1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_UY1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_CO1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_PT1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_ES1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_TR1.xml.gz',
+  'https://epgshare01.online/epgshare01/epg_ripper_FANDUEL1.xml.gz',
+  'https://epg.pw/api/epg.xml?channel_id=8486',
+  'https://epg.pw/api/epg.xml?channel_id=12358',
+  'https://epg.pw/api/epg.xml?channel_id=9206',
+]
+
+if __name__ == "__main__":
+    filter_and_build_epg(urls)
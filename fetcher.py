@@ -1,39 +1,49 @@
-import gzip
-import requests
 import os
 import xml.etree.ElementTree as ET
+from httpcache import HTTPCache, iter_body
+
+cache = HTTPCache()
 
 def fetchXML(filename, url):
     
     if doesFileExist(filename):
         return
     
-    response = requests.get(url)
-    if response.status_code != 200:
+    # Served from the local cache when the server answers 304 Not Modified
+    body_path = cache.fetch(url)
+    if body_path is None:
         print(f"Failed to fetch {url}")
+        return
 
-    if url.endswith('.gz'):
-        try:
-            decompressed_data = gzip.decompress(response.content)
-            saveFileAsBytes(filename, decompressed_data)
-        except Exception as e:
-            print(f"Failed to decompress and parse XML from {url}: {e}")
-    else:
-        try:
-            saveFileAsBytes(filename, response.content)
-        except Exception as e:
-            print(f"Failed to parse XML from {url}: {e}")
+    # Decode the cached body chunk by chunk instead of holding it in memory,
+    # into a temporary file so a corrupt body never leaves a partial file
+    # that doesFileExist would keep on later runs
+    tmp_path = filename + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as file:
+            for chunk in iter_body(body_path, gzipped=url.endswith('.gz')):
+                file.write(chunk)
+        os.replace(tmp_path, filename)
+    except Exception as e:
+        print(f"Failed to decompress and parse XML from {url}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 def fetchHTML(filename, url):
 
     if doesFileExist(filename):
         return
     
-    # Send a GET request to the URL
-    response = requests.get(url)    
+    # Send a (conditional) GET request to the URL
+    body_path = cache.fetch(url)
+    if body_path is None:
+        print(f"Failed to fetch {url}")
+        return
 
-    # Write the content to the file
-    saveFile(filename, response.text)
+    # Write the content to the file, decoded with the charset the server sent
+    encoding = cache.encoding(url) or 'utf-8'
+    with open(body_path, 'rb') as file:
+        saveFile(filename, file.read().decode(encoding, errors='replace'))
 
     print(f'Webpage downloaded and saved to {filename}')
 
@@ -41,10 +51,6 @@ def saveFile(filename, content):
     with open(filename, 'w', encoding='utf-8') as file:
         file.write(content)
 
-def saveFileAsBytes(filename, content):
-    with open(filename, 'wb') as file:
-        file.write(content)
-
 def doesFileExist(filename):
     if os.path.isfile(filename):
         print(f'File exists, not download new version {filename}.')
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+import requests
+
+# On-disk cache of downloaded files, revalidated with conditional GETs.
+#
+# Every cached url is stored as two files named after the sha1 of the url:
+#   <key>.body  the raw response body exactly as it came off the wire
+#   <key>.json  the validators (ETag / Last-Modified) and bookkeeping
+#
+# A request for a cached url sends If-None-Match / If-Modified-Since, and a
+# 304 answer is served from the local body. When the total size of the
+# cached bodies exceeds max_bytes the least recently used entries are evicted.
+
+CACHE_DIR = os.getenv("HTTP_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'http'))
+MAX_CACHE_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+
+class HTTPCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + '.body', base + '.json'
+
+    def _load_meta(self, meta_path):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _save_meta(self, meta_path, meta):
+        tmp_path = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        os.replace(tmp_path, meta_path)
+
+    def fetch(self, url, session=requests, headers=None, timeout=60):
+        """Return the path of an up-to-date local copy of url, or None if
+        the url could not be fetched and nothing usable is cached.
+
+        Raises requests.RequestException on network errors.
+        """
+        body_path, meta_path = self._paths(url)
+        meta = self._load_meta(meta_path) if os.path.isfile(body_path) else None
+
+        request_headers = dict(headers or {})
+        if meta:
+            if meta.get('etag'):
+                request_headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                request_headers['If-Modified-Since'] = meta['last_modified']
+
+        with session.get(url, headers=request_headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304 and meta:
+                meta['last_used'] = time.time()
+                self._save_meta(meta_path, meta)
+                return body_path
+
+            if response.status_code != 200:
+                return None
+
+            # Write to a temporary file first so that a failed download
+            # never replaces a good cached copy.
+            tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with open(tmp_path, 'wb') as file:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        file.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                os.replace(tmp_path, body_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            self._save_meta(meta_path, {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_type': response.headers.get('Content-Type'),
+                'size': size,
+                'sha256': digest.hexdigest(),
+                'last_used': time.time(),
+            })
+
+        self.evict(keep=meta_path)
+        return body_path
+
+    def content_hash(self, url):
+        """Return the sha256 hex digest of the cached body of url, or None
+        if url is not cached."""
+        body_path, meta_path = self._paths(url)
+        meta = self._load_meta(meta_path)
+        if meta is None or not os.path.isfile(body_path):
+            return None
+        if not meta.get('sha256'):
+            digest = hashlib.sha256()
+            for chunk in iter_body(body_path):
+                digest.update(chunk)
+            meta['sha256'] = digest.hexdigest()
+            self._save_meta(meta_path, meta)
+        return meta['sha256']
+
+    def encoding(self, url):
+        """Return the text encoding the server declared for url, the same
+        one requests' Response.text would use, or None if url is not cached
+        or no Content-Type was sent."""
+        _, meta_path = self._paths(url)
+        content_type = (self._load_meta(meta_path) or {}).get('content_type')
+        if not content_type:
+            return None
+        return requests.utils.get_encoding_from_headers({'content-type': content_type})
+
+    def evict(self, keep=None):
+        """Drop least recently used entries until the cache fits max_bytes."""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(self.directory, name)
+                if meta_path == keep:
+                    continue
+                meta = self._load_meta(meta_path)
+                if meta is None:
+                    continue
+                entries.append((meta.get('last_used', 0), meta.get('size', 0), meta_path))
+
+            total = sum(size for _, size, _ in entries)
+            if keep:
+                total += (self._load_meta(keep) or {}).get('size', 0)
+            for _, size, meta_path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                body_path = meta_path[:-len('.json')] + '.body'
+                for path in (body_path, meta_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                total -= size
+
+def iter_body(path, gzipped=False, chunk_size=CHUNK_SIZE):
+    """Yield the file at path chunk by chunk, gunzipping it on the fly when
+    gzipped is set. At most chunk_size decoded bytes are produced at a time,
+    so the whole body is never held in memory.
+    """
+    with open(path, 'rb') as file:
+        if not gzipped:
+            while chunk := file.read(chunk_size):
+                yield chunk
+            return
+
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = b''
+        while True:
+            if not data:
+                data = file.read(chunk_size)
+                if not data:
+                    break
+            if decoder.eof:
+                # another gzip member follows (concatenated .gz files)
+                decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            chunk = decoder.decompress(data, chunk_size)
+            data = decoder.unused_data if decoder.eof else decoder.unconsumed_tail
+            if chunk:
+                yield chunk
+        if not decoder.eof:
+            raise zlib.error("truncated gzip stream")
@@ -0,0 +1,132 @@
+# m3u.py – streaming M3U playlist reader and writer shared by the playlist
+# scripts in all_channels/ and Events/
+
+import os
+import re
+from collections import namedtuple
+
+HEADER = "#EXTM3U"
+BUFFER_SIZE = 64 * 1024
+
+# #EXTINF:<duration> key="value" ...,<title> – commas inside quoted values
+# do not end the attribute list
+EXTINF_RE = re.compile(r'#EXTINF:(?P<duration>[^\s,]*)(?P<attrs>(?:[^,"]|"[^"]*")*),(?P<title>.*)')
+ATTR_RE = re.compile(r'([\w-]+)="([^"]*)"')
+
+class Entry(namedtuple("Entry", "extinf options url")):
+    """One playlist item: the #EXTINF line, the directive lines between it
+    and the stream (#EXTVLCOPT and friends) and the stream URL. The lines
+    are kept verbatim, so an entry that is read and written back unchanged
+    comes out byte for byte the same; attrs and title are parsed on demand.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def build(cls, title, url, attrs=None, options=(), duration=-1):
+        """Entry with an #EXTINF line made from title and the attrs dict,
+        written in the dict's order."""
+        fields = "".join(f' {key}="{value}"' for key, value in (attrs or {}).items())
+        return cls(f"#EXTINF:{duration}{fields},{title}", tuple(options), url)
+
+    def _match(self):
+        return EXTINF_RE.match(self.extinf)
+
+    @property
+    def attrs(self):
+        m = self._match()
+        return dict(ATTR_RE.findall(m.group("attrs"))) if m else {}
+
+    @property
+    def title(self):
+        m = self._match()
+        return m.group("title") if m else ""
+
+    def __str__(self):
+        return "\n".join((self.extinf, *self.options, self.url))
+
+def vlc_options(origin=None, referrer=None, user_agent=None):
+    """#EXTVLCOPT lines for the HTTP headers a player has to send."""
+    options = []
+    if origin is not None:
+        options.append(f"#EXTVLCOPT:http-origin={origin}")
+    if referrer is not None:
+        options.append(f"#EXTVLCOPT:http-referrer={referrer}")
+    if user_agent is not None:
+        options.append(f"#EXTVLCOPT:http-user-agent={user_agent}")
+    return tuple(options)
+
+def parse(lines):
+    """Yield an Entry for every item in lines, and every line outside an
+    item (the header, comments, blank lines) as a plain string, so that
+    writing everything back reproduces the playlist. Only one item is held
+    at a time, whatever the size of the playlist.
+    """
+    extinf, options = None, []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if extinf is None:
+            if line.startswith("#EXTINF"):
+                extinf = line
+            else:
+                yield line
+        elif line.startswith("#EXTINF"):
+            # item without a URL – pass it through and start the next one
+            yield from (extinf, *options)
+            extinf, options = line, []
+        elif line.startswith("#") or not line.strip():
+            options.append(line)
+        else:
+            yield Entry(extinf, tuple(options), line.strip())
+            extinf, options = None, []
+    if extinf is not None:
+        yield from (extinf, *options)
+
+def read(path):
+    """parse() the playlist at path lazily, line by line."""
+    with open(path, encoding="utf-8") as file:
+        yield from parse(file)
+
+class Writer:
+    """Buffered playlist writer. Items go to a temporary file next to path
+    that replaces path only when the writer is closed without an error, so
+    readers never see a half-written playlist and path may be the very
+    playlist that is being read.
+
+        with Writer("out.m3u8") as playlist:
+            playlist.write(Entry.build("Name", url, {"group-title": "NEWS"}))
+    """
+
+    def __init__(self, path, header=(HEADER,), buffer_size=BUFFER_SIZE):
+        self.path = path
+        self.count = 0
+        self._tmp_path = f"{path}.{os.getpid()}.tmp"
+        self._file = open(self._tmp_path, "w", encoding="utf-8", newline="\n", buffering=buffer_size)
+        for line in header:
+            self._file.write(f"{line}\n")
+
+    def write(self, item):
+        """Write an Entry or a plain line."""
+        self._file.write(f"{item}\n")
+        if isinstance(item, Entry):
+            self.count += 1
+
+    def write_all(self, items):
+        for item in items:
+            self.write(item)
+
+    def close(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
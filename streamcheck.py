@@ -0,0 +1,453 @@
+# streamcheck.py – helpers shared by the stream validators in
+# all_channels/main.py and Events/events.py
+
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# -----------------------------------------------------------------------------
+
+# Per-host adaptive rate limiting
+
+# -----------------------------------------------------------------------------
+
+INITIAL_RATE = 20.0     # requests / second / host to start with
+MIN_RATE = 0.5
+MAX_RATE = 200.0
+RATE_INCREASE = 0.5     # added to a host's rate after every success
+RATE_DECREASE = 0.5     # a host's rate is multiplied by this on a 429
+DEFAULT_BACKOFF = 5.0   # seconds a host is paused after a 429 without Retry-After
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+def parse_retry_after(value):
+    """Seconds to wait according to a Retry-After header (either delta
+    seconds or an HTTP date), or None if the header is absent/invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class _Bucket:
+    __slots__ = ("rate", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate, now):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = now
+        self.blocked_until = 0.0
+
+class HostRateLimiter:
+    """Token bucket per host whose refill rate adapts AIMD-style: every
+    success adds `increase` (RATE_INCREASE), every 429 multiplies it by
+    `decrease` (RATE_DECREASE) and pauses the host for Retry-After (or
+    `backoff`, DEFAULT_BACKOFF) seconds. A bucket holds at most `rate`
+    tokens, so below 1/s requests to a host are spaced 1/rate seconds apart.
+
+    One limiter is shared by all workers of a validator, so a 429 seen by
+    one worker slows down the whole pool for that host instead of only
+    parking the thread that received it.
+    """
+
+    def __init__(self, rate=INITIAL_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE,
+                 increase=RATE_INCREASE, decrease=RATE_DECREASE, backoff=DEFAULT_BACKOFF):
+        self.initial_rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.backoff = backoff
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host, now):
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = _Bucket(self.initial_rate, now)
+        return bucket
+
+    def reserve(self, url):
+        """Take a token for url's host and return how long the caller has
+        to wait before sending the request."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._bucket(host_of(url), now)
+            bucket.tokens = min(bucket.rate, bucket.tokens + (now - bucket.updated) * bucket.rate)
+            bucket.updated = now
+            bucket.tokens -= 1
+            delay = -bucket.tokens / bucket.rate if bucket.tokens < 0 else 0.0
+            return max(delay, bucket.blocked_until - now)
+
+    def acquire(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def success(self, url):
+        with self._lock:
+            bucket = self._bucket(host_of(url), time.monotonic())
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+
+    def throttled(self, url, retry_after=None):
+        """Record a 429 for url's host; retry_after is the raw header value."""
+        pause = parse_retry_after(retry_after)
+        if pause is None:
+            pause = self.backoff
+        now = time.monotonic()
+        with self._lock:
+            host = host_of(url)
+            bucket = self._bucket(host, now)
+            bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+            bucket.tokens = min(bucket.tokens, 0.0)
+            bucket.blocked_until = max(bucket.blocked_until, now + pause)
+        logging.getLogger("streamcheck").debug(
+            "429 from %s – rate now %.1f/s, paused %.1f s", host, bucket.rate, pause)
+
+# -----------------------------------------------------------------------------
+
+# Persistent probe results
+
+# -----------------------------------------------------------------------------
+
+CACHE_PATH = os.getenv("STREAMCHECK_DB", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "streamcheck.sqlite"))
+POSITIVE_TTL = 30 * 60      # seconds a working URL is trusted without re-probing
+NEGATIVE_TTL = 10 * 60      # seconds a dead URL is trusted without re-probing
+MAX_ENTRIES = 50000
+
+# Outcome of probing one URL. latency is the time taken to fetch the
+# manifest and ttfb the time to its first byte, both in seconds and only
+# known for working streams.
+ProbeResult = namedtuple("ProbeResult", "status latency ttfb", defaults=(None, None))
+
+class ProbeCache:
+    """url → (status, checked_at, latency, ttfb) store in SQLite, shared by
+    every validator on the machine. A status of 200 is a working stream;
+    anything else (404, 410, 0 for a network error) is a dead one. Fresh
+    entries are answered from the store, stale ones have to be probed again.
+
+    Only conclusive results should be stored – a probe that gave up on
+    repeated 429s says nothing about the URL.
+    """
+
+    def __init__(self, path=CACHE_PATH, positive_ttl=POSITIVE_TTL,
+                 negative_ttl=NEGATIVE_TTL, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.enabled = True
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                "url TEXT PRIMARY KEY, status INTEGER NOT NULL, "
+                "checked_at REAL NOT NULL, latency REAL, ttfb REAL)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(probes)")}
+            if "ttfb" not in columns:
+                self._conn.execute("ALTER TABLE probes ADD COLUMN ttfb REAL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS probes_checked_at ON probes (checked_at)")
+        return self._conn
+
+    def lookup(self, url):
+        """Return the cached ProbeResult of url, or None if unknown or stale."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT status, checked_at, latency, ttfb FROM probes WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        status, checked_at, latency, ttfb = row
+        ttl = self.positive_ttl if status == 200 else self.negative_ttl
+        return ProbeResult(status, latency, ttfb) if time.time() - checked_at < ttl else None
+
+    def store(self, url, result):
+        if not self.enabled:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO probes (url, status, checked_at, latency, ttfb) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (url, result.status, time.time(), result.latency, result.ttfb))
+            conn.commit()
+
+    def evict(self):
+        """Drop entries too old to ever be served again, then the least
+        recently checked ones above max_entries."""
+        with self._lock:
+            conn = self._connection()
+            horizon = time.time() - max(self.positive_ttl, self.negative_ttl)
+            conn.execute("DELETE FROM probes WHERE checked_at < ?", (horizon,))
+            conn.execute(
+                "DELETE FROM probes WHERE url IN (SELECT url FROM probes "
+                "ORDER BY checked_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+            conn.commit()
+
+    def close(self):
+        if self._conn is None:
+            return
+        self.evict()
+        with self._lock:
+            self._conn.close()
+            self._conn = None
+
+# -----------------------------------------------------------------------------
+
+# Mirror host health
+
+# -----------------------------------------------------------------------------
+
+HEALTH_WINDOW = 500         # most recent probes per host that make up its score
+HEALTH_MAX_AGE = 24 * 3600  # probes older than this are forgotten
+THROTTLE_WINDOW = 3600      # 429s within this many seconds count against a host
+DEAD_STREAK = 10            # consecutive network errors that mark a host dead
+DEAD_RETRY = 30 * 60        # a dead host is tried again after this many seconds
+NEUTRAL_SCORE = 0.5         # score of a host without any history
+
+def _pct(value):
+    return f"{value * 100:6.1f}" if value is not None else f"{'-':>6}"
+
+def _ms(value):
+    return f"{value * 1000:7.0f}" if value is not None else f"{'-':>7}"
+
+class HostHealth:
+    """Rolling per-host probe history, persisted next to the probe cache.
+
+    Every answered request is recorded with its status (0 for a network
+    error) and latency. From the last HEALTH_WINDOW samples of a host we
+    derive its hit rate (share of probes answered 200), error rate,
+    p50/p95 latency and the number of recent 429s, and fold them into one
+    score used to order the mirrors. A host whose last DEAD_STREAK probes
+    all failed at the network level is skipped until DEAD_RETRY has passed.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._samples = defaultdict(lambda: deque(maxlen=HEALTH_WINDOW))
+        self._new = []
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS host_samples ("
+            "host TEXT NOT NULL, at REAL NOT NULL, status INTEGER NOT NULL, latency REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS host_samples_host_at ON host_samples (host, at)")
+        return conn
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT host, at, status, latency FROM host_samples WHERE at >= ? ORDER BY at",
+                (time.time() - HEALTH_MAX_AGE,)).fetchall()
+        finally:
+            conn.close()
+        for host, at, status, latency in rows:
+            self._samples[host].append((at, status, latency))
+
+    def record(self, url, status, latency=None):
+        sample = (time.time(), status, latency)
+        host = host_of(url)
+        with self._lock:
+            self._load()
+            self._samples[host].append(sample)
+            self._new.append((host,) + sample)
+
+    def stats(self, host):
+        with self._lock:
+            self._load()
+            samples = list(self._samples.get(host, ()))
+        now = time.time()
+        total = len(samples)
+        hits = sum(1 for _, status, _ in samples if status == 200)
+        errors = sum(1 for _, status, _ in samples if status == 0)
+        throttled = sum(1 for at, status, _ in samples if status == 429 and now - at < THROTTLE_WINDOW)
+        latencies = sorted(latency for _, status, latency in samples
+                           if status and status != 429 and latency is not None)
+        p50 = latencies[(len(latencies) - 1) // 2] if latencies else None
+        p95 = latencies[int((len(latencies) - 1) * 0.95)] if latencies else None
+
+        recent = samples[-DEAD_STREAK:]
+        dead = (len(recent) == DEAD_STREAK
+                and all(status == 0 for _, status, _ in recent)
+                and now - recent[-1][0] < DEAD_RETRY)
+
+        answered = total - sum(1 for _, status, _ in samples if status == 429)
+        hit_rate = hits / answered if answered else None
+        error_rate = errors / answered if answered else None
+        if not total:
+            score = NEUTRAL_SCORE
+        elif not answered:
+            score = 0.0
+        else:
+            score = hit_rate * (1 - error_rate) / (1 + (p50 or 0)) / (1 + throttled)
+
+        return {
+            "samples": total,
+            "hit_rate": hit_rate,
+            "error_rate": error_rate,
+            "p50": p50,
+            "p95": p95,
+            "throttled": throttled,
+            "dead": dead,
+            "score": score,
+        }
+
+    def order(self, templates):
+        """Return the URL templates best host first, without dead hosts.
+        If every host looks dead all templates are kept."""
+        stats = {tpl: self.stats(host_of(tpl)) for tpl in templates}
+        alive = [tpl for tpl in templates if not stats[tpl]["dead"]] or list(templates)
+        return sorted(alive, key=lambda tpl: -stats[tpl]["score"])
+
+    def hosts(self):
+        with self._lock:
+            self._load()
+            return sorted(self._samples)
+
+    def report(self, hosts=None):
+        lines = [f"{'host':<28} {'score':>6} {'n':>5} {'hit%':>6} {'err%':>6} "
+                 f"{'p50 ms':>7} {'p95 ms':>7} {'429s':>5}  state"]
+        for host in hosts or self.hosts():
+            st = self.stats(host)
+            lines.append(f"{host:<28} {st['score']:6.3f} {st['samples']:5d} {_pct(st['hit_rate'])} "
+                         f"{_pct(st['error_rate'])} {_ms(st['p50'])} {_ms(st['p95'])} "
+                         f"{st['throttled']:5d}  {'DEAD' if st['dead'] else 'ok'}")
+        return "\n".join(lines)
+
+    def close(self):
+        """Persist this run's samples and forget old ones."""
+        with self._lock:
+            new, self._new = self._new, []
+        conn = self._connect()
+        try:
+            conn.executemany("INSERT INTO host_samples VALUES (?, ?, ?, ?)", new)
+            conn.execute("DELETE FROM host_samples WHERE at < ?", (time.time() - HEALTH_MAX_AGE,))
+            conn.execute(
+                "DELETE FROM host_samples WHERE rowid IN (SELECT rowid FROM ("
+                "SELECT rowid, ROW_NUMBER() OVER (PARTITION BY host ORDER BY at DESC) AS n "
+                "FROM host_samples) WHERE n > ?)", (HEALTH_WINDOW,))
+            conn.commit()
+        finally:
+            conn.close()
+
+# -----------------------------------------------------------------------------
+
+# Bandwidth-bounded manifest probes
+
+# -----------------------------------------------------------------------------
+
+MANIFEST_BYTES = 4096   # never read more than this much of a probed manifest
+POOL_SIZE = 64          # pooled connections per host, above any worker count we use
+CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/")
+
+# Outcome of one manifest request. status is the HTTP status, with 206 (the
+# range was honoured) reported as 200 and a 2xx body that is not an HLS
+# playlist reported as 0, like a network error. ttfb and latency are the
+# seconds to the response headers and to the end of the capped read.
+ManifestProbe = namedtuple("ManifestProbe", "status ttfb latency retry_after")
+
+def make_session(pool_size=POOL_SIZE):
+    """A requests session whose pool keeps enough connections per host for
+    every worker, so released connections are reused instead of dropped."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def _range_headers(headers, max_bytes):
+    return {**(headers or {}), "Range": f"bytes=0-{max_bytes - 1}"}
+
+def _manifest_status(status, head):
+    if status in (200, 206):
+        return 200 if head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"#EXTM3U") else 0
+    return status
+
+def _body_fits(headers, max_bytes):
+    """True when the response declares a body of at most max_bytes, as it
+    does when the server honoured the Range header. Such a body is read to
+    the end, so the connection can be reused."""
+    length = headers.get("Content-Length", "")
+    if length.isdigit():
+        return int(length) <= max_bytes
+    m = CONTENT_RANGE_RE.match(headers.get("Content-Range", ""))
+    return bool(m) and int(m.group(2)) - int(m.group(1)) + 1 <= max_bytes
+
+def fetch_manifest(url, session=requests, headers=None, timeout=10, max_bytes=MANIFEST_BYTES):
+    """GET the first max_bytes of url and check that they start an HLS
+    playlist. A body declared to fit the cap (an honoured Range request) is
+    read to the end, so closing the response hands the connection back to
+    the pool; a server that ignored the Range header is cut off at the cap
+    and its connection dropped.
+
+    Raises requests.RequestException on network errors.
+    """
+    started = time.monotonic()
+    with session.get(url, headers=_range_headers(headers, max_bytes), timeout=timeout,
+                     stream=True, allow_redirects=True) as r:
+        ttfb = time.monotonic() - started
+        fits = _body_fits(r.headers, max_bytes)
+        head = b""
+        for chunk in r.iter_content(min(max_bytes, 1024)):
+            head += chunk
+            if len(head) >= max_bytes and not fits:
+                break
+        return ManifestProbe(_manifest_status(r.status_code, head[:max_bytes]), ttfb,
+                             time.monotonic() - started, r.headers.get("Retry-After"))
+
+async def fetch_manifest_async(session, url, max_bytes=MANIFEST_BYTES):
+    """asyncio twin of fetch_manifest() for an aiohttp session.
+
+    Raises aiohttp.ClientError or asyncio.TimeoutError on network errors.
+    """
+    started = time.monotonic()
+    async with session.get(url, headers=_range_headers(None, max_bytes)) as r:
+        ttfb = time.monotonic() - started
+        fits = _body_fits(r.headers, max_bytes)
+        head = b""
+        while fits or len(head) < max_bytes:
+            chunk = await r.content.read(1024 if fits else max_bytes - len(head))
+            if not chunk:
+                break
+            head += chunk
+        return ManifestProbe(_manifest_status(r.status, head[:max_bytes]), ttfb,
+                             time.monotonic() - started, r.headers.get("Retry-After"))
+
+if __name__ == "__main__":
+    # python streamcheck.py [db] – print the mirror health report
+    print(HostHealth(sys.argv[1] if len(sys.argv) > 1 else CACHE_PATH).report())